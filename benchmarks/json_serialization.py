@@ -0,0 +1,89 @@
+"""
+Compara a serialização antiga (clean_nan_values + str(_id) + json.dumps)
+com o CatalogJSONProvider, nos modos Python e orjson.
+
+Uso:
+    python benchmarks/json_serialization.py [quantidade_de_itens]
+"""
+import datetime
+import json
+import math
+import os
+import sys
+import timeit
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import json_provider
+
+
+def clean_nan_values(obj):
+    """Cópia da função usada antes nas rotas."""
+    if isinstance(obj, dict):
+        return {k: clean_nan_values(v) for k, v in obj.items() if v is not None and not (isinstance(v, float) and math.isnan(v))}
+    elif isinstance(obj, list):
+        return [clean_nan_values(item) for item in obj]
+    elif isinstance(obj, float) and math.isnan(obj):
+        return 0
+    return obj
+
+
+def make_items(count, with_nan=True):
+    items = []
+    for i in range(count):
+        items.append({
+            "_id": ObjectId(),
+            "Item ID": i,
+            "Name": f"Produto {i} - Ação inox",
+            "Category": "Ferramentas",
+            "Description": "Descrição do produto importada da planilha " * 3,
+            "Sale Price": 10.5 + i,
+            "Group Pile": float("nan") if with_nan and i % 7 == 0 else 12,
+            "Weight": 1.25,
+            "Height": 10.0,
+            "Width": float("nan") if with_nan and i % 5 == 0 else 20.0,
+            "Length": 30.0,
+            "Shape": "box",
+            "main_photo_url": f"/Items_Images/{i}.png",
+            "updated_at": datetime.datetime(2025, 1, 1, 12, 0, 0),
+        })
+    return items
+
+
+def old_path(items):
+    items = [dict(item) for item in items]
+    for item in items:
+        item["_id"] = str(item["_id"])
+        item["updated_at"] = item["updated_at"].isoformat()
+    return json.dumps(clean_nan_values(items), sort_keys=True)
+
+
+def run(label, items, repeat):
+    results = []
+    old_time = min(timeit.repeat(lambda: old_path(items), number=1, repeat=repeat))
+
+    json_provider.USE_ORJSON = False
+    results.append(("CatalogJSONProvider (python)", min(timeit.repeat(
+        lambda: json_provider.dumps(items, sort_keys=True), number=1, repeat=repeat))))
+    if json_provider.orjson is not None:
+        json_provider.USE_ORJSON = True
+        results.append(("CatalogJSONProvider (orjson)", min(timeit.repeat(
+            lambda: json_provider.dumps(items, sort_keys=True), number=1, repeat=repeat))))
+
+    print(label)
+    print(f"  {'clean_nan_values + json.dumps':<34} {old_time * 1000:8.1f} ms")
+    for name, elapsed in results:
+        print(f"  {name:<34} {elapsed * 1000:8.1f} ms  ({old_time / elapsed:.1f}x)")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    repeat = 5
+    print(f"{count} itens, melhor de {repeat} execuções")
+    run("Com NaN nos documentos:", make_items(count), repeat)
+    run("Sem NaN nos documentos:", make_items(count, with_nan=False), repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -60,28 +60,15 @@ def import_excel_to_mongodb(excel_path):
 
 def create_indexes():
     """
-    Cria índices para melhorar a performance
+    Cria os índices declarados em src/models/indexes.py (os mesmos garantidos na inicialização da aplicação)
     """
-    # Índices para Items
-    db.items.create_index("Item ID")
-    db.items.create_index("Category")
-    
-    # Índices para Cart
-    db.cart.create_index("Item ID")
-    db.cart.create_index("Client")
-    db.cart.create_index("Order")
-    
-    # Índices para Pedidos
-    db.pedidos.create_index("Order")
-    db.pedidos.create_index("Client")
-    
-    # Índices para Container
-    db.container.create_index("Client")
-    
-    # Índices para Fotos
-    db.fotos.create_index("Item ID")
-    
-    print("Índices criados com sucesso!")
+    # src.models lê MONGO_URI do .env ao ser importado
+    from dotenv import load_dotenv
+    load_dotenv()
+    from src.models.indexes import ensure_indexes
+
+    created = ensure_indexes(db)
+    print(f"Índices criados com sucesso! ({len(created)} novos)")
 
 if __name__ == "__main__":
     excel_path = "/home/ubuntu/upload/Vasap_export.xlsx"
@@ -0,0 +1,112 @@
+"""
+Comandos de manutenção da aplicação.
+
+Uso:
+    python manage.py backfill-photos
+    python manage.py rebuild-categories
+    python manage.py generate-thumbnails [--sizes list,detail]
+    python manage.py reconcile-carts
+    python manage.py ensure-indexes [--drop-undeclared]
+    python manage.py index-report
+"""
+import argparse
+import os
+import sys
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# As variáveis do .env precisam estar carregadas antes de importar src.models
+load_dotenv()
+
+
+def backfill_photos(args):
+    """Preenche main_photo_url e photo_count em todos os itens a partir da coleção fotos."""
+    from src.services.photo_service import backfill_photo_summaries
+    processed = backfill_photo_summaries()
+    print(f"Resumo de fotos atualizado em {processed} itens.")
+
+
+def rebuild_categories(args):
+    """Reconstrói o registro de categorias (contagem de itens por categoria) a partir de items."""
+    from src.services.category_registry import category_registry
+    counts = category_registry.rebuild()
+    print(f"Registro de categorias reconstruído: {len(counts)} categorias, {sum(counts.values())} itens.")
+
+
+def generate_thumbnails(args):
+    """Gera antecipadamente as miniaturas (original e WebP) das fotos servidas localmente."""
+    from src.services.image_service import IMAGE_SIZES, Image, pregenerate_derivatives
+    if Image is None:
+        print("Pillow não está instalado; as fotos continuarão sendo servidas no tamanho original.")
+        return
+    sizes = args.sizes.split(",") if args.sizes else list(IMAGE_SIZES)
+    unknown = [size for size in sizes if size not in IMAGE_SIZES]
+    if unknown:
+        sys.exit(f"Tamanhos desconhecidos: {', '.join(unknown)} (válidos: {', '.join(IMAGE_SIZES)})")
+    generated, skipped = pregenerate_derivatives(sizes)
+    print(f"Miniaturas geradas: {generated}; ignoradas: {skipped}.")
+
+
+def reconcile_carts(args):
+    """Recalcula os resumos dos carrinhos a partir das linhas e corrige os que divergem."""
+    from src.services.cart_summary import reconcile_summaries
+    repaired = reconcile_summaries()
+    print(f"Resumos de carrinho corrigidos: {repaired}.")
+
+
+def ensure_indexes(args):
+    """Cria os índices declarados em src/models/indexes.py que ainda não existem."""
+    from src.models.indexes import ensure_indexes, drop_undeclared_indexes, IndexBuildError
+    try:
+        created = ensure_indexes()
+    except IndexBuildError as e:
+        sys.exit(str(e))
+    print(f"Índices criados: {', '.join(created) if created else 'nenhum (todos já existiam)'}.")
+    if args.drop_undeclared:
+        dropped = drop_undeclared_indexes()
+        print(f"Índices não declarados removidos: {', '.join(dropped) if dropped else 'nenhum'}.")
+
+
+def index_report(args):
+    """Lista os índices declarados faltando, sem uso e os que existem no banco sem estar declarados."""
+    from src.models.indexes import index_report
+    report = index_report()
+    for entry in report:
+        ops = "-" if entry["ops"] is None else entry["ops"]
+        print(f"{entry['status']:<10} {entry['collection']}.{entry['name']} (acessos: {ops})")
+    # Código de saída 1 quando algum índice declarado está faltando (útil em verificações de deploy)
+    if any(entry["status"] == "missing" for entry in report):
+        sys.exit(1)
+
+
+COMMANDS = {
+    "backfill-photos": backfill_photos,
+    "rebuild-categories": rebuild_categories,
+    "generate-thumbnails": generate_thumbnails,
+    "reconcile-carts": reconcile_carts,
+    "ensure-indexes": ensure_indexes,
+    "index-report": index_report,
+}
+
+# Argumentos opcionais de cada comando
+ARGUMENTS = {
+    "generate-thumbnails": [("--sizes", {"help": "Tamanhos separados por vírgula (padrão: todos)"})],
+    "ensure-indexes": [("--drop-undeclared", {"action": "store_true", "help": "Remove os índices que não estão no registro"})],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comandos de manutenção da aplicação")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, command in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=command.__doc__)
+        for flag, options in ARGUMENTS.get(name, []):
+            subparser.add_argument(flag, **options)
+
+    args = parser.parse_args()
+    COMMANDS[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
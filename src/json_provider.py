@@ -0,0 +1,75 @@
+import datetime
+import decimal
+import json
+import math
+import os
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from flask.json.provider import DefaultJSONProvider
+
+# Codificador opcional em C (orjson). Sem ele, ou com JSON_ENCODER=python, usamos o
+# json.dumps da biblioteca padrão, que produz o mesmo resultado.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+USE_ORJSON = orjson is not None and os.getenv("JSON_ENCODER", "orjson") != "python"
+
+
+def _default(o):
+    """Converte os tipos vindos do MongoDB que o JSON não conhece."""
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, (datetime.datetime, datetime.date)):
+        return o.isoformat()
+    if isinstance(o, Decimal128):
+        o = o.to_decimal()
+    if isinstance(o, decimal.Decimal):
+        return float(o) if o.is_finite() else None
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _finite(o):
+    """Cópia de o com NaN e infinito (comuns em dados importados de planilhas) trocados por None."""
+    if isinstance(o, float):
+        return o if math.isfinite(o) else None
+    if isinstance(o, dict):
+        return {key: _finite(value) for key, value in o.items()}
+    if isinstance(o, (list, tuple)):
+        return [_finite(value) for value in o]
+    return o
+
+
+def dumps(obj, sort_keys=False, indent=None, ensure_ascii=True, separators=(",", ":")):
+    """Serializa obj para JSON: ObjectId vira string, datas ISO 8601, Decimal número e NaN/inf null."""
+    if USE_ORJSON and indent is None:
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, default=_default, option=option).decode("utf-8")
+        except TypeError:
+            # Ex.: inteiros acima de 64 bits; o json da biblioteca padrão aceita
+            pass
+    options = dict(default=_default, sort_keys=sort_keys, indent=indent,
+                   ensure_ascii=ensure_ascii, separators=separators, allow_nan=False)
+    try:
+        # Caminho rápido do módulo json (em C) quando não há NaN/inf no documento
+        return json.dumps(obj, **options)
+    except ValueError:
+        # O codificador em C para no primeiro NaN; troca todos por null e serializa de novo
+        return json.dumps(_finite(obj), **options)
+
+
+class CatalogJSONProvider(DefaultJSONProvider):
+    """Provider de JSON da aplicação; dispensa limpar NaN e converter _id nas rotas."""
+
+    def dumps(self, obj, **kwargs):
+        return dumps(
+            obj,
+            sort_keys=kwargs.get("sort_keys", self.sort_keys),
+            indent=kwargs.get("indent"),
+            ensure_ascii=kwargs.get("ensure_ascii", self.ensure_ascii),
+            separators=kwargs.get("separators", (",", ":")),
+        )
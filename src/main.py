@@ -16,12 +16,20 @@ from src.routes.clients import clients_bp
 from src.routes.admin import admin_bp
 from src.routes.cargo_optimizer import cargo_optimizer_bp
 from src.routes.auth import auth_bp
+from src.routes.images import images_bp
 from src.routes.auth import require_auth, require_admin
+from src.models.indexes import ensure_indexes, IndexBuildError
+from src.json_provider import CatalogJSONProvider
+from src.services.static_assets import static_assets
+from src.services.suggest_index import suggest_index
+from src.services.cart_summary import repair_line_weights
 
 
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+# Serializa ObjectId, datas, Decimal e NaN diretamente no jsonify
+app.json = CatalogJSONProvider(app)
 CORS(app)
 app.register_blueprint(clients_bp, url_prefix='/api/clients')
 app.register_blueprint(items_bp, url_prefix='/api/items')
@@ -31,21 +39,52 @@ app.register_blueprint(cargo_bp, url_prefix='/api/cargo')
 app.register_blueprint(admin_bp, url_prefix='/api/admin')
 app.register_blueprint(cargo_optimizer_bp, url_prefix='/cargo-optimizer')
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
+app.register_blueprint(images_bp, url_prefix='/img')
+
+# Corrige o peso total das linhas antigas do carrinho (gravado como 'Total wheight Kg')
+# antes dos índices, que unificam linhas repetidas somando esse peso
+try:
+    repaired = repair_line_weights()
+    if repaired:
+        print(f"Resumos de carrinho recalculados após corrigir o peso das linhas: {repaired}")
+except Exception as e:
+    print(f"Erro ao corrigir o peso das linhas do carrinho: {e}")
+
+# Garante os índices declarados em src/models/indexes.py (busca, carrinho, pedidos...).
+# Um índice que não pode ser criado interrompe a inicialização; falhas de conexão só são registradas.
+try:
+    created = ensure_indexes()
+    if created:
+        print(f"Índices criados: {', '.join(created)}")
+except IndexBuildError:
+    raise
+except Exception as e:
+    print(f"Erro ao verificar os índices do MongoDB: {e}")
+
+# Gera os nomes com hash e as versões comprimidas dos arquivos do front-end
+try:
+    static_assets.build()
+except OSError as e:
+    print(f"Erro ao preparar os arquivos estáticos: {e}")
+
+# Carrega o índice do autocompletar em segundo plano, antes da primeira busca
+# (cada worker do gunicorn importa este módulo e carrega o seu)
+suggest_index.start()
 
 @app.route('/profile')
 def profile_page():
     """ Serve a página de perfil estática. """
-    return send_from_directory(app.static_folder, 'profile.html')
+    return static_assets.page_response('profile.html') or send_from_directory(app.static_folder, 'profile.html')
 
 @app.route('/register')
 def register_page():
     """ Serve a página de cadastro estática. """
-    return send_from_directory(app.static_folder, 'register.html')
+    return static_assets.page_response('register.html') or send_from_directory(app.static_folder, 'register.html')
 
 @app.route('/admin')
 def admin_page():
     """ Serve a página de administração estática. """
-    return send_from_directory(app.static_folder, 'admin.html')
+    return static_assets.page_response('admin.html') or send_from_directory(app.static_folder, 'admin.html')
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -54,9 +93,18 @@ def serve(path):
     if static_folder_path is None:
             return "Static folder not configured", 404
 
+    # Arquivos com hash no nome (app.<hash>.js) e páginas HTML vêm da memória, já comprimidos
+    if path != "":
+        response = static_assets.asset_response(path) or static_assets.page_response(path)
+        if response is not None:
+            return response
+
     if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
         return send_from_directory(static_folder_path, path)
     else:
+        response = static_assets.page_response('index.html')
+        if response is not None:
+            return response
         index_path = os.path.join(static_folder_path, 'index.html')
         if os.path.exists(index_path):
             return send_from_directory(static_folder_path, 'index.html')
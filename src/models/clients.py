@@ -1,6 +1,7 @@
 import os
 from flask import Blueprint, jsonify, request
 from werkzeug.utils import secure_filename
+from pymongo.errors import DuplicateKeyError
 from src.models.models import get_clients_collection
 from datetime import datetime
 
@@ -67,7 +68,10 @@ def register_client():
 
         # Salva no MongoDB
         clients_collection = get_clients_collection()
-        clients_collection.insert_one(client_data)
+        try:
+            clients_collection.insert_one(client_data)
+        except DuplicateKeyError:
+            return jsonify({"error": "Já existe um cadastro de cliente para este usuário."}), 409
 
         return jsonify({"message": "Cadastro recebido com sucesso!"}), 201
 
@@ -0,0 +1,197 @@
+from pymongo.errors import OperationFailure
+from src.models.models import db
+
+# Registro dos índices do MongoDB usados pelas consultas da aplicação.
+#
+# ensure_indexes() cria os que faltam de forma idempotente (na inicialização e pelo
+# comando 'python manage.py ensure-indexes') e index_report() compara o registro com
+# o que existe no banco: índices faltando, sem uso desde o último restart do servidor
+# e não declarados (ex.: os criados por versões antigas do import_data.py).
+
+
+class IndexBuildError(RuntimeError):
+    """Um índice declarado não pôde ser criado (ex.: valores repetidos em um índice único)."""
+
+
+# Opções que identificam um índice além da chave (as demais, como o nome, não mudam seu comportamento)
+MATCHED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "weights", "default_language", "language_override")
+# Campos de index_information() que não são opções de create_index
+INFO_ONLY_FIELDS = ("v", "key", "ns")
+
+
+class IndexSpec:
+    """
+    Índice declarado de uma coleção. 'options' são repassadas ao create_index (unique,
+    sparse, weights...). 'prepare(collection)', se informado, roda antes de criar o índice
+    (ex.: unificar documentos repetidos antes de um índice único).
+    """
+
+    def __init__(self, collection, keys, name, prepare=None, **options):
+        self.collection = collection
+        self.keys = keys
+        self.name = name
+        self.prepare = prepare
+        self.options = options
+
+    @property
+    def is_text(self):
+        return any(direction == "text" for _, direction in self.keys)
+
+    def same_key(self, info):
+        """Indica se o índice existente tem a mesma chave (índices de texto: qualquer outro de texto)."""
+        key = [(field, direction if isinstance(direction, str) else int(direction)) for field, direction in info["key"]]
+        if self.is_text:
+            return ("_fts", "text") in key
+        return key == list(self.keys)
+
+    def matches(self, info):
+        """Indica se o índice existente (entrada de index_information) atende a esta declaração."""
+        if not self.same_key(info):
+            return False
+        for option in MATCHED_OPTIONS:
+            expected = self.options.get(option)
+            actual = info.get(option)
+            if option in ("unique", "sparse"):
+                expected, actual = bool(expected), bool(actual)
+            elif option == "weights" and actual is not None:
+                actual = {field: int(weight) for field, weight in actual.items()}
+            elif not self.is_text and option in ("default_language", "language_override"):
+                continue
+            if expected != actual:
+                return False
+        return True
+
+
+def _prepare_cart_lines(collection):
+    """Grava o volume e o peso das linhas antigas e unifica as repetidas antes do índice único do carrinho."""
+    from src.services.cart_summary import backfill_line_volumes, backfill_line_weights
+    from src.services.cart_service import merge_duplicate_lines
+    backfill_line_volumes(collection)
+    backfill_line_weights(collection)
+    merge_duplicate_lines(collection)
+
+
+INDEXES = [
+    # Catálogo: busca por Item ID, filtro por categoria ordenado por ID e busca textual.
+    # A versão 3 do índice de texto ignora acentos e maiúsculas ("acao" encontra "Ação").
+    IndexSpec("items", [("Item ID", 1)], "items_item_id_unique", unique=True, sparse=True),
+    IndexSpec("items", [("Category", 1), ("Item ID", 1)], "items_category_item_id"),
+    IndexSpec(
+        "items", [("Name", "text"), ("Category", "text"), ("Description", "text")], "items_text_search",
+        weights={"Name": 10, "Category": 5, "Description": 1},
+        default_language="portuguese",
+        # Evita que um campo 'language' eventualmente importado da planilha altere o idioma
+        language_override="search_language",
+    ),
+    # Carrinho: no máximo uma linha por (usuário, produto); também atende as leituras por user_id
+    IndexSpec("cart", [("user_id", 1), ("Item ID", 1)], "cart_user_item_unique", prepare=_prepare_cart_lines, unique=True),
+    IndexSpec("cart", [("Inventory ID", 1)], "cart_inventory_id"),
+    # Pedidos: listagens por keyset (Data, _id), do usuário e geral, e busca pelo número.
+    # Os filtros de 'deleted_by_users' ($ne / $size) não delimitam um índice; são aplicados sobre estes.
+    IndexSpec("pedidos", [("user_id", 1), ("Data", -1), ("_id", -1)], "pedidos_user_data"),
+    IndexSpec("pedidos", [("Data", -1), ("_id", -1)], "pedidos_data"),
+    IndexSpec("pedidos", [("Order", 1)], "pedidos_order_unique", unique=True, sparse=True),
+    # Fotos: fotos de um produto (principal primeiro) e Photo ID gerado pela sequência
+    IndexSpec("fotos", [("Item ID", 1), ("Is Primary", -1)], "fotos_item_primary"),
+    IndexSpec("fotos", [("Photo ID", 1)], "fotos_photo_id_unique", unique=True, sparse=True),
+    IndexSpec("users", [("email", 1)], "users_email_unique", unique=True),
+    # Cadastros pelo formulário público ainda não têm user_id: só os vinculados entram no índice
+    IndexSpec(
+        "clients", [("user_id", 1)], "clients_user_id_unique", unique=True,
+        partialFilterExpression={"user_id": {"$exists": True}},
+    ),
+    IndexSpec("client_prices", [("client_id", 1), ("item_id", 1)], "client_prices_client_item_unique", unique=True),
+]
+
+
+def _restore_index(collection, name, info):
+    """Recria um índice removido a partir da sua entrada em index_information()."""
+    options = {option: value for option, value in info.items() if option not in INFO_ONLY_FIELDS}
+    keys = info["key"]
+    if ("_fts", "text") in keys:
+        # A chave de um índice de texto é interna (_fts/_ftsx); os campos estão nos pesos
+        keys = [(field, "text") for field in info["weights"]]
+    collection.create_index(keys, name=name, **options)
+
+
+def ensure_index(spec, database=None):
+    """
+    Cria o índice declarado se nenhum índice existente o atender (idempotente).
+    Um índice com a mesma chave e outras opções é substituído; se a criação falhar,
+    ele é restaurado e IndexBuildError é lançado. Retorna True se o índice foi criado.
+    """
+    collection = (database if database is not None else db)[spec.collection]
+    existing = collection.index_information()
+    if any(spec.matches(info) for info in existing.values()):
+        return False
+
+    if spec.prepare:
+        spec.prepare(collection)
+    # Ex.: 'Item ID_1' (não único) criado pelo import_data.py, ou um índice de texto com outros pesos
+    replaced = {name: info for name, info in existing.items() if name != "_id_" and spec.same_key(info)}
+    for name in replaced:
+        collection.drop_index(name)
+    try:
+        collection.create_index(spec.keys, name=spec.name, **spec.options)
+    except OperationFailure as e:
+        for name, info in replaced.items():
+            _restore_index(collection, name, info)
+        raise IndexBuildError(f"Não foi possível criar o índice {spec.collection}.{spec.name}: {e}") from e
+    return True
+
+
+def ensure_indexes(database=None):
+    """Garante todos os índices do registro. Retorna os nomes ('coleção.índice') dos que foram criados."""
+    created = []
+    for spec in INDEXES:
+        if ensure_index(spec, database):
+            created.append(f"{spec.collection}.{spec.name}")
+    return created
+
+
+def _index_usage(collection):
+    """Acessos de cada índice desde o último restart do servidor ({} se $indexStats não for permitido)."""
+    try:
+        return {stat["name"]: stat["accesses"]["ops"] for stat in collection.aggregate([{"$indexStats": {}}])}
+    except OperationFailure:
+        return {}
+
+
+def index_report(database=None):
+    """
+    Compara o registro com os índices existentes. Retorna uma lista de
+    {collection, name, status, ops}, com status 'ok', 'missing', 'unused' (declarado,
+    sem acessos) ou 'undeclared' (existe no banco, mas não está no registro).
+    """
+    database = database if database is not None else db
+    report = []
+    declared = list(dict.fromkeys(spec.collection for spec in INDEXES))
+    others = sorted(set(database.list_collection_names()) - set(declared))
+    for collection_name in declared + others:
+        collection = database[collection_name]
+        existing = collection.index_information()
+        usage = _index_usage(collection)
+        matched = set()
+        for spec in (spec for spec in INDEXES if spec.collection == collection_name):
+            name = next((name for name, info in existing.items() if spec.matches(info)), None)
+            if name is None:
+                report.append({"collection": collection_name, "name": spec.name, "status": "missing", "ops": None})
+                continue
+            matched.add(name)
+            ops = usage.get(name)
+            report.append({"collection": collection_name, "name": name, "status": "unused" if ops == 0 else "ok", "ops": ops})
+        for name in existing:
+            if name != "_id_" and name not in matched:
+                report.append({"collection": collection_name, "name": name, "status": "undeclared", "ops": usage.get(name)})
+    return report
+
+
+def drop_undeclared_indexes(database=None):
+    """Remove os índices que não estão no registro (exceto _id). Retorna os nomes removidos."""
+    database = database if database is not None else db
+    dropped = []
+    for entry in index_report(database):
+        if entry["status"] == "undeclared":
+            database[entry["collection"]].drop_index(entry["name"])
+            dropped.append(f"{entry['collection']}.{entry['name']}")
+    return dropped
@@ -1,5 +1,8 @@
 from pymongo import MongoClient
 import os
+import threading
+import time
+from contextlib import contextmanager
 from sqlalchemy import create_engine
 
 # Lembre-se: a função load_dotenv() deve estar no seu main.py para carregar
@@ -56,29 +59,130 @@ def get_inventory_collection():
 def get_clients_collection():
     return db.clients
 
-# Função de conexão com Oracle (já corrigida anteriormente)
+# Coleção de preços especiais por cliente
+def get_client_prices_collection():
+    return db.client_prices
+
+# Coleção de metadados do catálogo (versão usada nos ETags)
+def get_catalog_meta_collection():
+    return db.catalog_meta
+
+# Coleção com a contagem de itens por categoria
+def get_category_registry_collection():
+    return db.category_registry
+
+# Coleção com o resumo (totais) do carrinho de cada usuário
+def get_cart_summaries_collection():
+    return db.cart_summaries
+
+# Coleção de contadores das sequências (nº do pedido, Item ID, Photo ID)
+def get_counters_collection():
+    return db.counters
+
+# --- ENGINE DO ORACLE (REGISTRO POR PROCESSO) ---
+# Um único engine (e pool de conexões) por processo. Ele é recriado quando o
+# PID muda, pois conexões herdadas do processo mestre do gunicorn não podem ser
+# compartilhadas entre workers.
+ORACLE_POOL_SIZE = int(os.getenv("ORACLE_POOL_SIZE", 5))
+ORACLE_MAX_OVERFLOW = int(os.getenv("ORACLE_MAX_OVERFLOW", 5))
+ORACLE_POOL_TIMEOUT = int(os.getenv("ORACLE_POOL_TIMEOUT", 10))
+ORACLE_POOL_RECYCLE = int(os.getenv("ORACLE_POOL_RECYCLE", 1800))
+
+_oracle_engine = None
+_oracle_engine_pid = None
+_oracle_engine_lock = threading.Lock()
+_oracle_pool_wait = {"checkouts": 0, "total_wait_seconds": 0.0, "max_wait_seconds": 0.0}
+
+
+def _build_oracle_engine():
+    user = os.getenv("ORACLE_USER")
+    password = os.getenv("ORACLE_PASSWORD")
+    host = os.getenv("ORACLE_HOST")
+    port = os.getenv("ORACLE_PORT")
+    service = os.getenv("ORACLE_SERVICE")
+
+    if not all([user, password, host, port, service]):
+        print("Erro: Uma ou mais variáveis de ambiente do Oracle não foram definidas.")
+        return None
+
+    oracle_uri = (
+        f"oracle+oracledb://{user}:{password}"
+        f"@{host}:{port}/?service_name={service}"
+    )
+    return create_engine(
+        oracle_uri,
+        pool_size=ORACLE_POOL_SIZE,
+        max_overflow=ORACLE_MAX_OVERFLOW,
+        pool_timeout=ORACLE_POOL_TIMEOUT,
+        pool_recycle=ORACLE_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+
+
 def get_oracle_engine():
     """
-    Cria e retorna um 'engine' do SQLAlchemy para o banco de dados Oracle.
-    O engine gerencia um pool de conexões.
+    Retorna o 'engine' do SQLAlchemy compartilhado pelo processo atual.
+    O engine é criado na primeira chamada e reutilizado pelas seguintes.
     """
-    try:
-        user = os.getenv("ORACLE_USER")
-        password = os.getenv("ORACLE_PASSWORD")
-        host = os.getenv("ORACLE_HOST")
-        port = os.getenv("ORACLE_PORT")
-        service = os.getenv("ORACLE_SERVICE")
-
-        if not all([user, password, host, port, service]):
-            print("Erro: Uma ou mais variáveis de ambiente do Oracle não foram definidas.")
+    global _oracle_engine, _oracle_engine_pid
+    pid = os.getpid()
+    if _oracle_engine is not None and _oracle_engine_pid == pid:
+        return _oracle_engine
+
+    with _oracle_engine_lock:
+        if _oracle_engine is not None and _oracle_engine_pid == pid:
+            return _oracle_engine
+        try:
+            if _oracle_engine is not None:
+                # Engine herdado via fork: descarta o pool sem fechar as conexões do processo pai
+                _oracle_engine.dispose(close=False)
+            _oracle_engine = _build_oracle_engine()
+            _oracle_engine_pid = pid
+            _oracle_pool_wait.update(checkouts=0, total_wait_seconds=0.0, max_wait_seconds=0.0)
+            return _oracle_engine
+        except Exception as e:
+            print(f"Erro ao criar o engine do Oracle com SQLAlchemy: {e}")
+            _oracle_engine = None
             return None
 
-        oracle_uri = (
-            f"oracle+oracledb://{user}:{password}"
-            f"@{host}:{port}/?service_name={service}"
-        )
-        engine = create_engine(oracle_uri)
-        return engine
-    except Exception as e:
-        print(f"Erro ao criar o engine do Oracle com SQLAlchemy: {e}")
-        return None
\ No newline at end of file
+
+@contextmanager
+def oracle_connection():
+    """
+    Abre uma conexão do pool compartilhado registrando o tempo de espera pelo checkout.
+    Lança RuntimeError se o Oracle não estiver configurado.
+    """
+    engine = get_oracle_engine()
+    if engine is None:
+        raise RuntimeError("Engine do Oracle indisponível")
+    started = time.monotonic()
+    connection = engine.connect()
+    waited = time.monotonic() - started
+    _oracle_pool_wait["checkouts"] += 1
+    _oracle_pool_wait["total_wait_seconds"] += waited
+    _oracle_pool_wait["max_wait_seconds"] = max(_oracle_pool_wait["max_wait_seconds"], waited)
+    try:
+        yield connection
+    finally:
+        connection.close()
+
+
+def get_oracle_pool_stats():
+    """Estatísticas do pool do Oracle no processo atual."""
+    engine = _oracle_engine if _oracle_engine_pid == os.getpid() else None
+    if engine is None:
+        return {"initialized": False, "pid": os.getpid()}
+    pool = engine.pool
+    checkouts = _oracle_pool_wait["checkouts"]
+    return {
+        "initialized": True,
+        "pid": os.getpid(),
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "max_overflow": ORACLE_MAX_OVERFLOW,
+        "checkouts": checkouts,
+        "avg_wait_seconds": round(_oracle_pool_wait["total_wait_seconds"] / checkouts, 6) if checkouts else 0.0,
+        "max_wait_seconds": round(_oracle_pool_wait["max_wait_seconds"], 6),
+    }
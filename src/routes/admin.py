@@ -1,11 +1,19 @@
 from flask import Blueprint, jsonify, request
-from src.models.models import db, get_users_collection, get_items_collection, get_fotos_collection, get_pedidos_collection
-import math
+from src.models.models import get_users_collection, get_items_collection, get_fotos_collection, get_pedidos_collection
+from src.models.models import get_oracle_pool_stats, get_client_prices_collection
+import re
 import pandas as pd
 from io import StringIO
 from bson import ObjectId
 import requests
 from src.routes.auth import require_auth, require_admin
+from src.services.pagination import find_page, InvalidCursorError
+from src.services.catalog_events import notify_catalog_changed
+from src.services.photo_service import run_in_transaction, refresh_photo_summaries
+from src.services.price_book import client_price_book
+from src.services.catalog_version import price_version
+from src.services.category_registry import category_registry, category_deltas
+from src.services.sequence_service import item_id_sequence, photo_id_sequence
 from pymongo import UpdateOne
 from datetime import datetime
 from flask import send_file
@@ -13,23 +21,10 @@ from io import BytesIO # <-- LINHA ADICIONADA
 
 admin_bp = Blueprint("admin", __name__)
 
-def clean_nan_values(obj):
-    """Remove valores NaN e None de um objeto"""
-    if isinstance(obj, dict):
-        return {k: clean_nan_values(v) for k, v in obj.items() if v is not None and not (isinstance(v, float) and math.isnan(v))}
-    elif isinstance(obj, list):
-        return [clean_nan_values(item) for item in obj]
-    elif isinstance(obj, float) and math.isnan(obj):
-        return 0
-    return obj
-
 @admin_bp.route("/items", methods=["GET"])
 def get_admin_items():
     """Retorna todos os itens para administração"""
     items = list(get_items_collection().find({}))
-    for item in items:
-        item["_id"] = str(item["_id"])
-    items = clean_nan_values(items)
     return jsonify(items)
 
 @admin_bp.route('/photos/cleanup', methods=['POST'])
@@ -41,7 +36,7 @@ def cleanup_photos():
     """
     try:
         fotos_collection = get_fotos_collection()
-        all_photos = list(fotos_collection.find({}, {"_id": 1, "Photo URL": 1}))
+        all_photos = list(fotos_collection.find({}, {"_id": 1, "Photo URL": 1, "Item ID": 1}))
         
         ids_to_delete = []
         
@@ -68,7 +63,16 @@ def cleanup_photos():
 
         # Se houver IDs para deletar, execute uma única operação de exclusão em massa
         if ids_to_delete:
-            result = fotos_collection.delete_many({"_id": {"$in": ids_to_delete}})
+            deleted = set(ids_to_delete)
+            affected_items = [photo["Item ID"] for photo in all_photos if photo["_id"] in deleted and "Item ID" in photo]
+
+            def delete_and_refresh(session):
+                result = fotos_collection.delete_many({"_id": {"$in": ids_to_delete}}, session=session)
+                refresh_photo_summaries(affected_items, session=session)
+                return result
+
+            result = run_in_transaction(delete_and_refresh)
+            notify_catalog_changed(affected_items)
             return jsonify({
                 "message": f"Limpeza concluída. {result.deleted_count} fotos inválidas foram removidas.",
                 "deleted_count": result.deleted_count
@@ -99,6 +103,11 @@ def update_item(item_id):
         update_fields['Description'] = data['Description']
     if 'Category' in data:
         update_fields['Category'] = data['Category']
+
+    # Categoria anterior, para manter o registro de categorias atualizado
+    previous = None
+    if 'Category' in update_fields:
+        previous = get_items_collection().find_one({"Item ID": int(item_id)}, {"Category": 1})
     
     result = get_items_collection().update_one(
         {"Item ID": int(item_id)},
@@ -106,6 +115,9 @@ def update_item(item_id):
     )
     
     if result.modified_count:
+        if previous is not None:
+            category_registry.adjust(category_deltas([previous.get('Category')], [update_fields['Category']]))
+        notify_catalog_changed([int(item_id)])
         return jsonify({"message": "Item updated successfully"})
     return jsonify({"message": "Item not found or no changes made"}), 404
 
@@ -136,10 +148,25 @@ def bulk_update_items():
         value = float(value) if update_type == 'price' else int(value)
     
     # Atualiza os itens
+    item_ids = [int(item_id) for item_id in items]
+
+    # Categorias que serão substituídas, para manter o registro de categorias atualizado
+    replaced_categories = []
+    if field == 'Category':
+        replaced_categories = [
+            item.get('Category') for item in get_items_collection().find(
+                {"Item ID": {"$in": item_ids}, "Category": {"$ne": value}}, {"Category": 1}
+            )
+        ]
+
     result = get_items_collection().update_many(
-        {"Item ID": {"$in": [int(item_id) for item_id in items]}},
+        {"Item ID": {"$in": item_ids}},
         {"$set": {field: value}}
     )
+    if result.modified_count:
+        if replaced_categories:
+            category_registry.adjust(category_deltas(replaced_categories, [value] * len(replaced_categories)))
+        notify_catalog_changed(item_ids)
     
     return jsonify({
         "message": f"Updated {result.modified_count} items",
@@ -185,6 +212,9 @@ def bulk_price_adjustment():
             )
             updated_count += 1
     
+    if updated_count:
+        notify_catalog_changed([item["Item ID"] for item in items_to_update if "Item ID" in item])
+
     return jsonify({
         "message": f"Updated prices for {updated_count} items",
         "updated_count": updated_count
@@ -232,6 +262,11 @@ def get_admin_stats():
         "top_categories": top_categories
     })
 
+@admin_bp.route("/metrics/oracle-pool", methods=["GET"])
+def get_oracle_pool_metrics():
+    """Retorna as estatísticas do pool de conexões do Oracle deste worker"""
+    return jsonify(get_oracle_pool_stats())
+
 # Novas rotas para cadastro de produtos
 @admin_bp.route('/products', methods=['POST'])
 def create_product():
@@ -243,9 +278,7 @@ def create_product():
         items_collection = get_items_collection()
         
         # Gera um novo Item ID
-        last_item = items_collection.find().sort("Item ID", -1).limit(1)
-        last_item_list = list(last_item)
-        new_item_id = (last_item_list[0]["Item ID"] + 1) if last_item_list else 1
+        new_item_id = item_id_sequence.next()
         
         # Dados do novo produto
         new_product = {
@@ -263,6 +296,8 @@ def create_product():
         }
         
         result = items_collection.insert_one(new_product)
+        category_registry.adjust(category_deltas([], [new_product["Category"]]))
+        notify_catalog_changed([new_item_id])
         
         return jsonify({
             'message': 'Produto cadastrado com sucesso',
@@ -289,10 +324,8 @@ def bulk_create_products():
         
         items_collection = get_items_collection()
         
-        # Gera novos IDs para os produtos
-        last_item = items_collection.find().sort("Item ID", -1).limit(1)
-        last_item_list = list(last_item)
-        start_id = (last_item_list[0]["Item ID"] + 1) if last_item_list else 1
+        # Reserva um bloco contíguo de IDs para os produtos
+        start_id = item_id_sequence.reserve(len(df)) if len(df) else 0
         
         products_to_insert = []
         
@@ -313,6 +346,8 @@ def bulk_create_products():
         
         if products_to_insert:
             result = items_collection.insert_many(products_to_insert)
+            category_registry.adjust(category_deltas([], [product["Category"] for product in products_to_insert]))
+            notify_catalog_changed([product["Item ID"] for product in products_to_insert])
             return jsonify({
                 'message': f'{len(products_to_insert)} produtos cadastrados com sucesso',
                 'inserted_count': len(result.inserted_ids)
@@ -334,9 +369,7 @@ def create_photo():
         fotos_collection = get_fotos_collection()
         
         # Gera um novo Photo ID
-        last_photo = fotos_collection.find({"Photo ID": {"$exists": True}}).sort("Photo ID", -1).limit(1)
-        last_photo_list = list(last_photo)
-        new_photo_id = (last_photo_list[0]["Photo ID"] + 1) if last_photo_list else 1
+        new_photo_id = photo_id_sequence.next()
         
         # Dados da nova foto
         new_photo = {
@@ -347,14 +380,19 @@ def create_photo():
             "Is Primary": data.get('is_primary', False)
         }
         
-        # Se esta foto é marcada como principal, remove a marcação das outras fotos do mesmo produto
-        if new_photo["Is Primary"]:
-            fotos_collection.update_many(
-                {"Item ID": new_photo["Item ID"]},
-                {"$set": {"Is Primary": False}}
-            )
-        
-        result = fotos_collection.insert_one(new_photo)
+        def insert_and_refresh(session):
+            # Se esta foto é marcada como principal, remove a marcação das outras fotos do mesmo produto
+            if new_photo["Is Primary"]:
+                fotos_collection.update_many(
+                    {"Item ID": new_photo["Item ID"]},
+                    {"$set": {"Is Primary": False}},
+                    session=session
+                )
+            fotos_collection.insert_one(new_photo, session=session)
+            refresh_photo_summaries([new_photo["Item ID"]], session=session)
+
+        run_in_transaction(insert_and_refresh)
+        notify_catalog_changed([new_photo["Item ID"]])
         
         return jsonify({
             'message': 'Foto cadastrada com sucesso',
@@ -382,10 +420,8 @@ def bulk_create_photos():
         
         fotos_collection = get_fotos_collection()
         
-        # Gera novos IDs para as fotos
-        last_photo = fotos_collection.find().sort("Photo ID", -1).limit(1)
-        last_photo_list = list(last_photo)
-        start_id = (last_photo_list[0]["Photo ID"] + 1) if last_photo_list else 1
+        # Reserva um bloco contíguo de IDs para as fotos
+        start_id = photo_id_sequence.reserve(len(df)) if len(df) else 0
         
         photos_to_insert = []
 
@@ -404,7 +440,15 @@ def bulk_create_photos():
             photos_to_insert.append(photo)
         
         if photos_to_insert:
-            result = fotos_collection.insert_many(photos_to_insert)
+            affected_items = [photo["Item ID"] for photo in photos_to_insert]
+
+            def insert_and_refresh(session):
+                result = fotos_collection.insert_many(photos_to_insert, session=session)
+                refresh_photo_summaries(affected_items, session=session)
+                return result
+
+            result = run_in_transaction(insert_and_refresh)
+            notify_catalog_changed(affected_items)
             return jsonify({
                 'message': f'{len(photos_to_insert)} fotos cadastradas com sucesso',
                 'inserted_count': len(result.inserted_ids)
@@ -424,10 +468,6 @@ def get_item_photos(item_id):
         fotos_collection = get_fotos_collection()
         photos = list(fotos_collection.find({"Item ID": item_id}))
         
-        # Converte ObjectId para string
-        for photo in photos:
-            photo['_id'] = str(photo['_id'])
-        
         return jsonify(photos)
     
     except Exception as e:
@@ -440,10 +480,18 @@ def delete_photo(photo_id):
     """
     try:
         fotos_collection = get_fotos_collection()
-        # Usa ObjectId para encontrar o documento pelo seu _id
-        result = fotos_collection.delete_one({"_id": ObjectId(photo_id)})
+
+        def delete_and_refresh(session):
+            # Usa ObjectId para encontrar o documento pelo seu _id
+            deleted = fotos_collection.find_one_and_delete({"_id": ObjectId(photo_id)}, session=session)
+            if deleted and "Item ID" in deleted:
+                refresh_photo_summaries([deleted["Item ID"]], session=session)
+            return deleted
+
+        deleted = run_in_transaction(delete_and_refresh)
         
-        if result.deleted_count > 0:
+        if deleted:
+            notify_catalog_changed([deleted.get("Item ID")])
             return jsonify({'message': 'Foto removida com sucesso'})
         else:
             return jsonify({'error': 'Foto não encontrada'}), 404
@@ -468,24 +516,31 @@ def update_photo(photo_id):
             update_data['Description'] = data['description']
         if 'is_primary' in data:
             update_data['Is Primary'] = data['is_primary']
-            
-            # Se esta foto está sendo marcada como principal...
-            if data['is_primary']:
-                # Primeiro, busca a foto para descobrir o Item ID dela
-                photo = fotos_collection.find_one({"_id": ObjectId(photo_id)})
-                if photo:
-                    # Remove a marcação "Is Primary" de todas as outras fotos do mesmo produto
-                    fotos_collection.update_many(
-                        {"Item ID": photo["Item ID"], "_id": {"$ne": ObjectId(photo_id)}},
-                        {"$set": {"Is Primary": False}}
-                    )
-        
-        result = fotos_collection.update_one(
-            {"_id": ObjectId(photo_id)},
-            {"$set": update_data}
-        )
+
+        # Busca a foto para descobrir o Item ID dela (necessário para atualizar o resumo do item)
+        photo = fotos_collection.find_one({"_id": ObjectId(photo_id)}, {"Item ID": 1})
+
+        def update_and_refresh(session):
+            # Se esta foto está sendo marcada como principal, remove a marcação das outras fotos do mesmo produto
+            if photo and update_data.get('Is Primary'):
+                fotos_collection.update_many(
+                    {"Item ID": photo["Item ID"], "_id": {"$ne": ObjectId(photo_id)}},
+                    {"$set": {"Is Primary": False}},
+                    session=session
+                )
+            result = fotos_collection.update_one(
+                {"_id": ObjectId(photo_id)},
+                {"$set": update_data},
+                session=session
+            )
+            if photo and result.modified_count > 0:
+                refresh_photo_summaries([photo["Item ID"]], session=session)
+            return result
+
+        result = run_in_transaction(update_and_refresh)
         
         if result.modified_count > 0:
+            notify_catalog_changed([photo["Item ID"]] if photo else None)
             return jsonify({'message': 'Foto atualizada com sucesso'})
         else:
             # Pode acontecer se o usuário clicar em "Tornar Principal" em uma foto que já é a principal
@@ -501,14 +556,22 @@ def update_photo(photo_id):
 def get_all_admin_orders():
     """ Retorna TODOS os pedidos do sistema para o admin. """
     try:
+        # Modo cursor (?cursor=&per_page=): página de pedidos, do mais recente para o mais antigo
+        if 'cursor' in request.args:
+            per_page = int(request.args.get('per_page', 50))
+            pedidos, next_cursor = find_page(
+                get_pedidos_collection(), {}, [("Data", -1), ("_id", -1)], per_page,
+                cursor=request.args.get('cursor')
+            )
+            return jsonify({'orders': pedidos, 'next_cursor': next_cursor})
+
         # Retorna todos os pedidos, ordenados pelo mais recente
         pedidos = list(get_pedidos_collection().find({}).sort("Data", -1))
         
-        for pedido in pedidos:
-            pedido['_id'] = str(pedido['_id'])
-        
         return jsonify(pedidos)
     
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
@@ -547,15 +610,22 @@ def get_all_database_items():
         final_query = {'$and': query_conditions}
 
         items_collection = get_items_collection()
+
+        # Modo cursor (?cursor=&per_page=): página ordenada por Item ID
+        if 'cursor' in request.args:
+            per_page = int(request.args.get('per_page', 100))
+            items, next_cursor = find_page(
+                items_collection, final_query, [("Item ID", 1)], per_page,
+                cursor=request.args.get('cursor')
+            )
+            return jsonify({'items': items, 'next_cursor': next_cursor})
+
         items = list(items_collection.find(final_query).sort("Item ID", 1))
         
-        for item in items:
-            item["_id"] = str(item["_id"])
-        
-        items = clean_nan_values(items)
-        
         return jsonify(items)
 
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
@@ -566,8 +636,6 @@ def get_all_clients():
     """ Retorna uma lista de todos os usuários para o seletor. """
     users_collection = get_users_collection()
     clients = list(users_collection.find({}, {"_id": 1, "email": 1, "name": 1}))
-    for client in clients:
-        client["_id"] = str(client["_id"])
     return jsonify(clients)
 
 @admin_bp.route('/adjust-client-prices', methods=['POST'])
@@ -584,7 +652,7 @@ def adjust_client_prices():
         return jsonify({"error": "Dados insuficientes"}), 400
 
     items_collection = get_items_collection()
-    client_prices_collection = db.client_prices # Acessa a nova coleção
+    client_prices_collection = get_client_prices_collection()
 
     all_items = list(items_collection.find({}, {"Item ID": 1, "Sale Price": 1}))
     
@@ -615,6 +683,9 @@ def adjust_client_prices():
     
     if operations:
         result = client_prices_collection.bulk_write(operations)
+        client_price_book.invalidate(client_id)
+        # Muda o ETag do catálogo: os preços personalizados fazem parte das respostas em cache
+        price_version.bump()
         return jsonify({
             "message": f"Preços especiais aplicados a {len(all_items)} produtos para o cliente selecionado.",
             "matched_count": result.matched_count,
@@ -683,6 +754,8 @@ def import_items_from_xlsx():
             items_collection = get_items_collection()
             
             operations = []
+            imported_ids = []
+            imported_categories = {}
             for index, row in df.iterrows():
                 # Validação básica: O Item ID é essencial
                 if 'Item ID' not in row or pd.isna(row['Item ID']):
@@ -709,11 +782,30 @@ def import_items_from_xlsx():
                             upsert=True # Atualiza se existir, insere se não existir
                         )
                     )
+                    imported_ids.append(item_id)
+                    if 'Category' in update_data:
+                        imported_categories[item_id] = update_data['Category']
 
             if not operations:
                 return jsonify({'message': 'Nenhum dado válido encontrado no arquivo para importar.'}), 400
 
+            # Categorias atuais dos itens importados, antes da gravação
+            previous_categories = {
+                item["Item ID"]: item.get('Category')
+                for item in items_collection.find({"Item ID": {"$in": imported_ids}}, {"Item ID": 1, "Category": 1})
+            }
+
             result = items_collection.bulk_write(operations)
+            # Itens novos da planilha trazem o próprio Item ID; o contador não pode ficar para trás
+            item_id_sequence.advance_to(max(imported_ids))
+
+            before = list(previous_categories.values())
+            after = [
+                imported_categories.get(item_id, previous_categories.get(item_id))
+                for item_id in dict.fromkeys(imported_ids)
+            ]
+            category_registry.adjust(category_deltas(before, after))
+            notify_catalog_changed(imported_ids)
             return jsonify({
                 'message': 'Importação concluída com sucesso!',
                 'updated_count': result.modified_count,
@@ -1,6 +1,8 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 from src.models.models import get_pedidos_collection
 from src.routes.auth import require_auth # Protegendo a rota
+from src.services.order_listing import list_order_summaries, parse_per_page
+from src.services.pagination import InvalidCursorError
 
 cargo_bp = Blueprint("cargo", __name__)
 
@@ -8,14 +10,27 @@ cargo_bp = Blueprint("cargo", __name__)
 @require_auth # Garante que apenas usuários logados possam ver os pedidos
 def get_pedidos_para_cargo():
     """
-    Retorna todos os pedidos ativos (não excluídos) para a tela de otimização de carga.
+    Retorna uma página dos pedidos ativos (não excluídos) para a tela de otimização de carga.
+    Os pedidos vêm resumidos; os itens de um pedido são obtidos em /api/cargo/<número>.
+    Parâmetros: ?cursor= (next_cursor da página anterior) e ?per_page=.
     """
     # Retorna pedidos que não foram marcados como excluídos por nenhum usuário
     query = {"deleted_by_users": {"$size": 0}}
     
-    pedidos = list(get_pedidos_collection().find(query).sort("Data", -1))
+    try:
+        pedidos, next_cursor = list_order_summaries(
+            query, cursor=request.args.get("cursor"), per_page=parse_per_page(request.args.get("per_page"))
+        )
+    except InvalidCursorError as e:
+        return jsonify({"error": str(e)}), 400
     
-    for pedido in pedidos:
-        pedido["_id"] = str(pedido["_id"])
-        
-    return jsonify(pedidos)
\ No newline at end of file
+    return jsonify({"orders": pedidos, "next_cursor": next_cursor})
+
+@cargo_bp.route("/<int:order_number>", methods=["GET"])
+@require_auth
+def get_pedido_para_cargo(order_number):
+    """ Retorna um pedido ativo completo (com os itens) pelo número. """
+    pedido = get_pedidos_collection().find_one({"Order": order_number, "deleted_by_users": {"$size": 0}})
+    if pedido:
+        return jsonify(pedido)
+    return jsonify({"message": "Pedido não encontrado"}), 404
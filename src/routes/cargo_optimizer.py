@@ -1,5 +1,7 @@
 from flask import Blueprint, jsonify, request, current_app, send_from_directory
 import math
+from src.services.http_cache import conditional_get
+from src.services.static_assets import static_assets
 
 cargo_optimizer_bp = Blueprint("cargo_optimizer", __name__)
 
@@ -7,10 +9,11 @@ cargo_optimizer_bp = Blueprint("cargo_optimizer", __name__)
 @cargo_optimizer_bp.route("/")
 def cargo_optimizer_page():
     """Serve a página estática do otimizador de cargas."""
-    return send_from_directory(current_app.static_folder, 'cargo_optimizer.html')
+    return static_assets.page_response('cargo_optimizer.html') or send_from_directory(current_app.static_folder, 'cargo_optimizer.html')
 
 # Nova rota de API para fornecer os tipos de container
 @cargo_optimizer_bp.route("/api/containers", methods=["GET"])
+@conditional_get(depends_on_catalog=False)
 def get_container_types():
     """Retorna a lista de tipos de container padronizados."""
     container_types = [
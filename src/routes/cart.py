@@ -1,40 +1,66 @@
 from flask import Blueprint, jsonify, request
 from src.models.models import get_cart_collection, get_items_collection
 from datetime import datetime
-import uuid
-import math
+import re
 from src.routes.auth import require_auth
+from src.services.stock_service import stock_lookup
+from src.services.price_book import client_price_book
+from src.services.cart_totals import totals_from_lines
+from src.services.cart_service import (
+    get_cart_lines, get_cart_totals as cart_totals, add_cart_line, add_cart_lines, set_cart_line_amount,
+    remove_cart_line, clear_cart_lines, flush_cart, discard_cart, CART_ITEM_PROJECTION
+)
+from src.services.sequence_service import order_number_sequence
 
 cart_bp = Blueprint("cart", __name__)
 
-def clean_nan_values(obj):
-    """Remove valores NaN e None de um objeto"""
-    if isinstance(obj, dict):
-        return {k: clean_nan_values(v) for k, v in obj.items() if v is not None and not (isinstance(v, float) and math.isnan(v))}
-    elif isinstance(obj, list):
-        return [clean_nan_values(item) for item in obj]
-    elif isinstance(obj, float) and math.isnan(obj):
-        return 0
-    return obj
-
-def calculate_volume(item):
-    """Calcula o volume em m³ baseado nas dimensões do produto"""
+# Limite de linhas aceitas por POST /bulk
+MAX_BULK_LINES = 500
+# Maior quantidade aceita por operação (valores maiores estourariam o inteiro de 64 bits do BSON)
+MAX_AMOUNT = 1_000_000
+
+def parse_amount(value):
+    """Quantidade enviada pelo cliente como inteiro entre 1 e MAX_AMOUNT; None se for inválida."""
+    if isinstance(value, bool):
+        return None
     try:
-        height = float(item.get('Height', 0)) / 100  # cm para m
-        width = float(item.get('Width', 0)) / 100    # cm para m
-        length = float(item.get('Length', 0)) / 100  # cm para m
-        return height * width * length
-    except (ValueError, TypeError):
-        return 0
+        amount = int(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if isinstance(value, float) and value != amount:
+        return None
+    return amount if 0 < amount <= MAX_AMOUNT else None
+
+def parse_bulk_lines(data):
+    """
+    Lê as linhas de POST /bulk: {"lines": [{"item_id", "amount"}]} ou {"csv": "..."} colado de uma
+    planilha (código e quantidade por linha, separados por vírgula, ponto e vírgula ou tabulação).
+    Retorna [(nº da linha, item_id, quantidade)], ainda sem validação.
+    """
+    parsed = []
+    if isinstance(data.get('lines'), list):
+        for number, line in enumerate(data['lines'], start=1):
+            line = line if isinstance(line, dict) else {}
+            parsed.append((number, line.get('item_id'), line.get('amount', 1)))
+    elif isinstance(data.get('csv'), str):
+        for number, row in enumerate(data['csv'].splitlines(), start=1):
+            cells = [cell.strip() for cell in re.split(r'[,;\t]', row)]
+            if not cells[0]:
+                continue
+            # Ignora o cabeçalho ("Item ID;Quantidade") na primeira linha
+            if number == 1 and not cells[0].lstrip('-').isdigit():
+                continue
+            parsed.append((number, cells[0], cells[1] if len(cells) > 1 and cells[1] else 1))
+    return parsed
 
 @cart_bp.route("/", methods=["GET"])
 @require_auth
 def get_cart():
     user_id = request.current_user["user_id"]
-    cart_items = list(get_cart_collection().find({"user_id": user_id}))
+    cart_items = get_cart_lines(user_id)
+    stock = stock_lookup.get_many([item["Item ID"] for item in cart_items])
     for item in cart_items:
-        item["_id"] = str(item["_id"])
-    cart_items = clean_nan_values(cart_items)
+        item["available_stock"] = stock.get(item["Item ID"], 0)
     return jsonify(cart_items)
 
 @cart_bp.route("/totals", methods=["GET"])
@@ -42,125 +68,109 @@ def get_cart():
 def get_cart_totals():
     """Retorna os totais do carrinho: valor, peso e cubagem"""
     user_id = request.current_user["user_id"]
-    cart_items = list(get_cart_collection().find({"user_id": user_id}))
-    
-    total_value = 0
-    total_weight = 0
-    total_volume = 0
-    total_items = len(cart_items)
-    
-    for cart_item in cart_items:
-        # Busca informações completas do item
-        item = get_items_collection().find_one({"Item ID": cart_item["Item ID"]})
-        if item:
-            amount = cart_item.get("Amount", 1)
-            
-            # Valor total
-            price = float(item.get("Sale Price", 0))
-            total_value += price * amount
-            
-            # Peso total
-            weight = float(item.get("Weight", 0))
-            total_weight += weight * amount
-            
-            # Volume total (cubagem)
-            volume = calculate_volume(item)
-            total_volume += volume * amount
-    
-    return jsonify({
-        "total_items": total_items,
-        "total_value": round(total_value, 2),
-        "total_weight": round(total_weight, 2),
-        "total_volume": round(total_volume, 6),  # m³ com 6 casas decimais
-        "currency": "USD"
-    })
+    return jsonify(cart_totals(user_id))
 
 @cart_bp.route("/clear", methods=["DELETE"])
 @require_auth
 def clear_cart():
     """Limpa todo o carrinho de um cliente"""
     user_id = request.current_user["user_id"]
-    result = get_cart_collection().delete_many({"user_id": user_id})
+    removed = clear_cart_lines(user_id)
     
     return jsonify({
         "message": f"Carrinho limpo com sucesso",
-        "items_removed": result.deleted_count
+        "items_removed": removed
     })
 
 @cart_bp.route("/", methods=["POST"])
 @require_auth
 def add_to_cart():
-    data = request.json
+    data = request.get_json(silent=True) or {}
     user_id = request.current_user["user_id"]
+    amount = parse_amount(data.get("amount", 1))
+    if amount is None:
+        return jsonify({"message": f"A quantidade deve ser um número inteiro entre 1 e {MAX_AMOUNT}"}), 400
+    try:
+        item_id = int(data.get("item_id"))
+    except (TypeError, ValueError):
+        return jsonify({"message": "Código do produto inválido"}), 400
     
     # Busca informações do item
-    item = get_items_collection().find_one({"Item ID": data["item_id"]})
+    item = get_items_collection().find_one({"Item ID": item_id}, CART_ITEM_PROJECTION)
     if not item:
         return jsonify({"message": "Item not found"}), 404
+    price, _ = client_price_book.resolve(user_id, item["Item ID"], item["Sale Price"])
     
-    # Verifica se o item já existe no carrinho
-    existing_item = get_cart_collection().find_one({
-        "Item ID": data["item_id"],
-        "user_id": user_id
+    # Cria a linha ou soma à existente em uma única operação atômica
+    cart_item, created = add_cart_line(user_id, item, amount, price)
+    return jsonify(cart_item), 201 if created else 200
+
+@cart_bp.route("/bulk", methods=["POST"])
+@require_auth
+def add_to_cart_bulk():
+    """Adiciona várias linhas ao carrinho de uma vez (lista de {item_id, amount} ou CSV colado)"""
+    user_id = request.current_user["user_id"]
+    lines = parse_bulk_lines(request.get_json(silent=True) or {})
+    if not lines:
+        return jsonify({"message": "Envie 'lines' ([{item_id, amount}]) ou 'csv'"}), 400
+    if len(lines) > MAX_BULK_LINES:
+        return jsonify({"message": f"Máximo de {MAX_BULK_LINES} linhas por requisição"}), 400
+
+    results = []
+    amounts = {}
+    for number, raw_item_id, raw_amount in lines:
+        result = {"line": number, "item_id": raw_item_id, "amount": raw_amount}
+        amount = parse_amount(raw_amount)
+        try:
+            item_id = int(raw_item_id)
+        except (TypeError, ValueError):
+            result.update(status="invalid", message="Código ou quantidade inválidos")
+        else:
+            if amount is None:
+                result.update(status="invalid", message=f"A quantidade deve ser um número inteiro entre 1 e {MAX_AMOUNT}")
+            else:
+                result.update(item_id=item_id, amount=amount)
+                # Linhas repetidas do mesmo produto são somadas em uma só operação
+                amounts[item_id] = amounts.get(item_id, 0) + amount
+        results.append(result)
+
+    # Valida todos os produtos com uma única consulta
+    items = {
+        item["Item ID"]: item
+        for item in get_items_collection().find({"Item ID": {"$in": list(amounts)}}, CART_ITEM_PROJECTION)
+    }
+    entries = []
+    for item_id, amount in amounts.items():
+        item = items.get(item_id)
+        if item is not None:
+            price, _ = client_price_book.resolve(user_id, item_id, item.get("Sale Price", 0))
+            entries.append((item, amount, price))
+    outcome = add_cart_lines(user_id, entries)
+
+    for result in results:
+        if "status" in result:
+            continue
+        status = outcome.get(result["item_id"])
+        if result["item_id"] not in items:
+            result.update(status="not_found", message="Produto não encontrado")
+        elif status in ("added", "updated"):
+            result["status"] = status
+        else:
+            result.update(status="error", message=status)
+
+    applied = sum(result["status"] in ("added", "updated") for result in results)
+    return jsonify({
+        "results": results,
+        "applied": applied,
+        "failed": len(results) - applied,
+        "totals": cart_totals(user_id)
     })
-    
-    if existing_item:
-        # Atualiza a quantidade
-        new_amount = existing_item["Amount"] + data.get("amount", 1)
-        new_total_price = item["Sale Price"] * new_amount
-        new_total_weight = (item.get("Weight", 0) * new_amount)
-        
-        get_cart_collection().update_one(
-            {"_id": existing_item["_id"]},
-            {"$set": {
-                "Amount": new_amount,
-                "Total price": new_total_price,
-                "Total wheight Kg": new_total_weight,
-                "DateTime": datetime.now().isoformat()
-            }}
-        )
-        
-        updated_item = get_cart_collection().find_one({"_id": existing_item["_id"]})
-        updated_item["_id"] = str(updated_item["_id"])
-        return jsonify(updated_item)
-    else:
-        # Cria novo item no carrinho
-        amount = data.get("amount", 1)
-        cart_item = {
-            "Inventory ID": str(uuid.uuid4())[:8],
-            "Item ID": data["item_id"],
-            "Description": item.get("Description", ""),
-            "Category": item.get("Category", ""),
-            "Name": item.get("Name", ""),
-            "Shape": item.get("Shape", "box"),
-            
-            # --- CAMPOS ADICIONADOS/CORRIGIDOS ---
-            "Length": item.get("Length", 0),
-            "Width": item.get("Width", 0),
-            "Height": item.get("Height", 0),
-            "Weight": item.get("Weight", 0), # Peso unitário
-            # --- FIM DOS CAMPOS ADICIONADOS ---
-
-            "DateTime": datetime.now().isoformat(),
-            "Amount": amount,
-            "Sale Price": item["Sale Price"],
-            "Total price": item["Sale Price"] * amount,
-            "Total weight Kg": item.get("Weight", 0) * amount, # Corrigido de "wheight"
-            "Client": user_id,
-            "user_id": user_id
-        }
-        
-        get_cart_collection().insert_one(cart_item)
-        cart_item["_id"] = str(cart_item["_id"])
-        
-        return jsonify(cart_item), 201
 
 @cart_bp.route("/<inventory_id>", methods=["DELETE"])
 @require_auth
 def remove_from_cart(inventory_id):
     user_id = request.current_user["user_id"]
-    result = get_cart_collection().delete_one({"Inventory ID": inventory_id, "user_id": user_id})
-    if result.deleted_count:
+    if remove_cart_line(user_id, inventory_id):
         return jsonify({"message": "Item removed from cart"})
     return jsonify({"message": "Item not found in cart"}), 404
 
@@ -168,36 +178,16 @@ def remove_from_cart(inventory_id):
 @require_auth
 def update_cart_item(inventory_id):
     """Atualiza a quantidade de um item no carrinho"""
-    data = request.json
-    new_amount = data.get("amount", 1)
+    data = request.get_json(silent=True) or {}
+    new_amount = parse_amount(data.get("amount", 1))
+    if new_amount is None:
+        return jsonify({"message": f"A quantidade deve ser um número inteiro entre 1 e {MAX_AMOUNT}"}), 400
     user_id = request.current_user["user_id"]
     
-    cart_item = get_cart_collection().find_one({"Inventory ID": inventory_id, "user_id": user_id})
-    if not cart_item:
+    # Os totais da linha são recalculados com o preço e o peso gravados nela
+    updated_item = set_cart_line_amount(user_id, inventory_id, new_amount)
+    if not updated_item:
         return jsonify({"message": "Item not found in cart"}), 404
-    
-    # Busca informações do produto
-    item = get_items_collection().find_one({"Item ID": cart_item["Item ID"]})
-    if not item:
-        return jsonify({"message": "Product not found"}), 404
-    
-    # Calcula novos totais
-    new_total_price = item["Sale Price"] * new_amount
-    new_total_weight = item.get("Weight", 0) * new_amount
-    
-    # Atualiza o item
-    get_cart_collection().update_one(
-        {"Inventory ID": inventory_id},
-        {"$set": {
-            "Amount": new_amount,
-            "Total price": new_total_price,
-            "Total wheight Kg": new_total_weight,
-            "DateTime": datetime.now().isoformat()
-        }}
-    )
-    
-    updated_item = get_cart_collection().find_one({"Inventory ID": inventory_id})
-    updated_item["_id"] = str(updated_item["_id"])
     return jsonify(updated_item)
 
 @cart_bp.route("/place-order", methods=["POST"])
@@ -205,24 +195,31 @@ def update_cart_item(inventory_id):
 def place_order():
     user_id = request.current_user["user_id"]
     
+    # O pedido é montado a partir do MongoDB: antes, grava o que estiver pendente no cache
+    flush_cart(user_id)
+
     # Busca itens do carrinho para o cliente
     cart_items = list(get_cart_collection().find({"user_id": user_id}))
     
     if not cart_items:
         return jsonify({"message": "Cart is empty"}), 400
     
+    # Registra a disponibilidade no momento do pedido (uma única consulta ao Oracle)
+    stock = stock_lookup.get_many([item["Item ID"] for item in cart_items])
+
     # Limpa os _id do MongoDB dos itens do carrinho antes de salvá-los no pedido
     for item in cart_items:
         item.pop('_id', None)
+        item["available_stock"] = stock.get(item["Item ID"], 0)
 
-    # Calcula totais usando a função de totais
-    totals_response = get_cart_totals()
-    totals = totals_response.get_json()
+    # Os totais vêm das mesmas linhas (e preços) que /totals e o resumo do carrinho,
+    # de modo que o total do pedido é o que o cliente viu e a soma dos seus itens
+    totals = totals_from_lines(cart_items)
     
     # Cria o pedido
     from src.models.models import get_pedidos_collection
     order = {
-        "Order": len(list(get_pedidos_collection().find({}))) + 1,
+        "Order": order_number_sequence.next(),
         "Data": datetime.now().isoformat(),
         "Total Itens": totals["total_items"],
         "Total price": totals["total_value"],
@@ -237,8 +234,7 @@ def place_order():
     get_pedidos_collection().insert_one(order)
     
     # Limpa o carrinho
-    get_cart_collection().delete_many({"user_id": user_id})
+    discard_cart(user_id)
     
-    order["_id"] = str(order["_id"])
     return jsonify(order), 201
 
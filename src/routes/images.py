@@ -0,0 +1,35 @@
+from flask import Blueprint, request, send_file, send_from_directory, abort
+from src.services.image_service import (
+    STATIC_FOLDER, IMAGE_SIZES, local_image_path, derivative_format, get_derivative
+)
+
+images_bp = Blueprint("images", __name__)
+
+# As derivadas mudam só quando o original muda; o navegador revalida após um dia
+IMAGE_MAX_AGE = 86400
+
+
+@images_bp.route("/<size>/<path:filename>", methods=["GET"])
+def get_image(size, filename):
+    """Serve uma foto local redimensionada (list, detail ou zoom), em WebP quando o navegador aceita."""
+    if size not in IMAGE_SIZES:
+        abort(404)
+    relative = local_image_path(filename)
+    if relative is None:
+        abort(404)
+
+    accept_webp = 'image/webp' in request.headers.get('Accept', '')
+    fmt = derivative_format(relative, accept_webp)
+    try:
+        path = get_derivative(relative, size, fmt)
+    except OSError as e:
+        print(f"Erro ao gerar a imagem {size}/{relative}: {e}")
+        path = None
+
+    if path is None:
+        # Sem Pillow (ou imagem ilegível): serve o original
+        response = send_from_directory(STATIC_FOLDER, relative, max_age=IMAGE_MAX_AGE)
+    else:
+        response = send_file(path, mimetype=f"image/{fmt}", max_age=IMAGE_MAX_AGE, conditional=True)
+    response.vary.add('Accept')
+    return response
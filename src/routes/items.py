@@ -1,44 +1,80 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response, stream_with_context
 from src.models.models import get_items_collection
 from src.models.models import get_fotos_collection
-from src.models.models import get_items_collection, get_oracle_engine
-from sqlalchemy import text
+from src.services.stock_service import stock_snapshot, stock_lookup
+from src.services.search_service import search_plans
+from src.services.count_cache import catalog_count_cache
+from src.services.price_book import client_price_book
+from src.services.category_registry import category_registry
+from src.services.http_cache import conditional_get, stock_snapshot_key
+from src.services.image_service import image_url
+from src.services.suggest_index import suggest_index, DEFAULT_SUGGESTIONS
+from src.json_provider import dumps
+from src.services.pagination import decode_cursor, keyset_filter, split_page, InvalidCursorError
 import math
 import re
 
 items_bp = Blueprint("items", __name__)
 
-def clean_nan_values(obj):
-    """Remove valores NaN e None de um objeto"""
-    if isinstance(obj, dict):
-        return {k: clean_nan_values(v) for k, v in obj.items() if v is not None and not (isinstance(v, float) and math.isnan(v))}
-    elif isinstance(obj, list):
-        return [clean_nan_values(item) for item in obj]
-    elif isinstance(obj, float) and math.isnan(obj):
-        return 0
-    return obj
+# Limite de IDs aceitos pelas consultas em lote
+MAX_BATCH_IDS = 500
+
+def parse_item_ids(raw_ids, limit=MAX_BATCH_IDS):
+    """Converte '1,2,3' em [1, 2, 3]. Lança ValueError para IDs inválidos ou acima do limite."""
+    item_ids = [int(part) for part in raw_ids.split(',') if part.strip()]
+    if len(item_ids) > limit:
+        raise ValueError(f"Máximo de {limit} IDs por requisição")
+    return item_ids
+
+# Campos retornados pela consulta de itens em lote
+ITEM_BATCH_PROJECTION = {
+    '_id': 0, 'Item ID': 1, 'Name': 1, 'Category': 1, 'Description': 1, 'Shape': 1,
+    'Sale Price': 1, 'Group Pile': 1, 'Weight': 1, 'Height': 1, 'Width': 1, 'Length': 1,
+    'main_photo_url': 1, 'photo_count': 1
+}
+PHOTO_BATCH_PROJECTION = {'_id': 1, 'Item ID': 1, 'Photo ID': 1, 'Photo URL': 1, 'Description': 1, 'Is Primary': 1}
+
+# Itens lidos do cursor (e linhas escritas) por vez na exportação NDJSON
+EXPORT_BATCH_SIZE = 500
+
+def optional_user_id():
+    """Retorna o user_id do token enviado, se houver; as rotas do catálogo não exigem login."""
+    auth_header = request.headers.get('Authorization')
+    if auth_header and auth_header.startswith('Bearer '):
+        from src.routes.auth import verify_jwt_token
+        payload = verify_jwt_token(auth_header[7:])
+        if payload:
+            return payload.get('user_id')
+    return None
+
+# Quantidade padrão e máxima de faixas do histograma de preços (?facets=1)
+DEFAULT_PRICE_BUCKETS = 5
+MAX_PRICE_BUCKETS = 20
+
+def facet_stages(price_buckets, category_stages=()):
+    """
+    Sub-pipelines do $facet com a contagem por categoria e o histograma de preços.
+    category_stages (o filtro de categoria) vale para o histograma, mas não para a contagem
+    por categoria, que senão mostraria apenas a categoria selecionada.
+    """
+    return {
+        'categories': [
+            {'$group': {'_id': '$Category', 'count': {'$sum': 1}}},
+            {'$sort': {'count': -1, '_id': 1}}
+        ],
+        'price_histogram': [
+            *category_stages,
+            # Ignora preços ausentes ou NaN vindos da planilha
+            {'$match': {'Sale Price': {'$gte': 0}}},
+            {'$bucketAuto': {'groupBy': '$Sale Price', 'buckets': price_buckets}}
+        ]
+    }
 
 @items_bp.route("/", methods=["GET"])
+@conditional_get(extra_key=stock_snapshot_key)
 def get_all_items():
-    # --- INÍCIO DA LÓGICA ORACLE CORRIGIDA ---
-    stock_map = {}
-    engine = get_oracle_engine()
-    if engine:
-        # Usar 'with' garante que a conexão seja fechada automaticamente
-        try:
-            with engine.connect() as connection:
-                sql_query = text("""
-                    SELECT CODPROD, GREATEST(ESTOQUE - RESERVADO, 0) AS DISPONIVEL
-                    FROM TGFEST
-                    WHERE CODLOCAL = 401
-                """)
-                result = connection.execute(sql_query)
-                for row in result:
-                    # O resultado de 'row' é uma tupla, então acessamos por índice
-                    stock_map[row[0]] = row[1]
-        except Exception as e:
-            print(f"Erro ao executar a query no Oracle com SQLAlchemy: {e}")
-    # --- FIM DA LÓGICA ORACLE ---
+    # Disponibilidade vem do snapshot em memória; a página nunca espera pelo Oracle
+    stock_map = stock_snapshot.get_map()
 
     # Parâmetros de paginação
     page = int(request.args.get('page', 1))
@@ -48,7 +84,8 @@ def get_all_items():
     category_filter = request.args.get('category', '')
     min_price = request.args.get('min_price', '')
     max_price = request.args.get('max_price', '')
-    search = request.args.get('search', '')
+    # Normaliza os espaços para que buscas equivalentes compartilhem a contagem em cache
+    search = ' '.join(request.args.get('search', '').split())
     query = {}
     if category_filter:
         query['Category'] = {'$regex': re.escape(category_filter), '$options': 'i'}
@@ -61,84 +98,246 @@ def get_all_items():
         except ValueError: pass
     if price_query:
         query['Sale Price'] = price_query
-    if search:
-        or_conditions = []
+    items_collection = get_items_collection()
+
+    # Modo cursor (?cursor=): paginação por keyset, sem contagem total
+    cursor_mode = 'cursor' in request.args
+    cursor = request.args.get('cursor', '') if cursor_mode else ''
+    # Modo facetas (?facets=1): página, total, categorias e faixas de preço em uma única agregação
+    facets_mode = not cursor_mode and request.args.get('facets') in ('1', 'true')
+    if facets_mode:
         try:
-            or_conditions.append({'Item ID': int(search)})
+            price_buckets = min(max(int(request.args.get('price_buckets', DEFAULT_PRICE_BUCKETS)), 1), MAX_PRICE_BUCKETS)
         except ValueError:
-            pass
-        search_words = search.split()
-        and_conditions = []
-        for word in search_words:
-            and_conditions.append({'Name': {'$regex': re.escape(word), '$options': 'i'}})
-        or_conditions.append({'$and': and_conditions})
-        or_conditions.append({'Category': {'$regex': re.escape(search), '$options': 'i'}})
-        query['$or'] = or_conditions
+            return jsonify({'error': "Parâmetro 'price_buckets' inválido"}), 400
+
+    # Sem busca, ordenação estável por ID. Com busca, o índice de texto (todos os termos,
+    # ordenados por relevância + ID) e, se ele não achar nenhum produto, prefixos no Name.
+    plans = search_plans(search, query) if search else [(query, [], [('Item ID', 1)])]
+    cursor_error = None
+    for query, search_stages, sort_fields in plans:
+        pipeline = [{'$match': query}, *search_stages]
+        if cursor_mode:
+            if cursor:
+                # O cursor já identifica a consulta da primeira página (as ordenações têm tamanhos diferentes)
+                try:
+                    cursor_values = decode_cursor(cursor, sort_fields)
+                except InvalidCursorError as e:
+                    cursor_error = e
+                    continue
+                cursor_error = None
+                pipeline.append({'$match': keyset_filter(sort_fields, cursor_values)})
+            pipeline.extend([{'$sort': dict(sort_fields)}, {'$limit': per_page + 1}])
+            items = list(items_collection.aggregate(pipeline))
+            if items or cursor:
+                break
+        elif facets_mode:
+            skip = (page - 1) * per_page
+            # O filtro de categoria sai do $match inicial e é aplicado dentro de cada faceta, exceto na de categorias
+            category_stages = [{'$match': {'Category': query['Category']}}] if 'Category' in query else []
+            pipeline[0] = {'$match': {field: value for field, value in query.items() if field != 'Category'}}
+            pipeline.append({'$facet': {
+                'items': [*category_stages, {'$sort': dict(sort_fields)}, {'$skip': skip}, {'$limit': per_page}],
+                'total': [*category_stages, {'$count': 'count'}],
+                **facet_stages(price_buckets, category_stages)
+            }})
+            result = next(items_collection.aggregate(pipeline))
+            items = result['items']
+            total_items = result['total'][0]['count'] if result['total'] else 0
+            total_is_exact = True
+            total_pages = math.ceil(total_items / per_page) if per_page > 0 else 0
+            if total_items:
+                break
+        else:
+            total_items, total_is_exact = catalog_count_cache.count(items_collection, query)
+            skip = (page - 1) * per_page
+            total_pages = math.ceil(total_items / per_page) if per_page > 0 else 0
+            # Sem resultados, a página nem é consultada
+            items = []
+            if total_items:
+                pipeline.extend([{'$sort': dict(sort_fields)}, {'$skip': skip}, {'$limit': per_page}])
+                items = list(items_collection.aggregate(pipeline))
+                break
+    if cursor_error is not None:
+        return jsonify({'error': str(cursor_error)}), 400
+    if cursor_mode:
+        items, next_cursor = split_page(items, sort_fields, per_page)
+
+    user_id = optional_user_id()
+
+    # 'main_photo_url' e 'photo_count' já vêm desnormalizados no próprio item (ver photo_service)
+
+    # Preços especiais do cliente aplicados em memória, sem $lookup por item
+    client_price_book.apply(user_id, items)
 
-    items_collection = get_items_collection()
-    total_items = items_collection.count_documents(query)
-    skip = (page - 1) * per_page
-    total_pages = math.ceil(total_items / per_page) if per_page > 0 else 0
-    
-    user_id = None
-    auth_header = request.headers.get('Authorization')
-    if auth_header and auth_header.startswith('Bearer '):
-        from src.routes.auth import verify_jwt_token
-        token = auth_header[7:]
-        payload = verify_jwt_token(token)
-        if payload:
-            user_id = payload.get('user_id')
-
-    pipeline = [
-        {'$match': query}, {'$skip': skip}, {'$limit': per_page},
-        {'$addFields': {'original_price': '$Sale Price'}},
-    ]
-    if user_id:
-        pipeline.extend([
-            {'$lookup': {'from': 'client_prices', 'let': {'itemId': '$Item ID'}, 'pipeline': [{'$match': {'$expr': {'$and': [{'$eq': ['$item_id', '$$itemId']}, {'$eq': ['$client_id', user_id]}]}}}], 'as': 'special_price_info'}},
-            {'$addFields': {'special_price_obj': {'$arrayElemAt': ['$special_price_info', 0]}}},
-            {'$addFields': {'Sale Price': {'$ifNull': ['$special_price_obj.special_price', '$Sale Price']}, 'has_special_price': {'$cond': {'if': {'$gt': [{'$size': '$special_price_info'}, 0]}, 'then': True, 'else': False}}}}
-        ])
-    pipeline.extend([
-        {'$lookup': {'from': 'fotos', 'localField': 'Item ID', 'foreignField': 'Item ID', 'as': 'photos'}},
-        {'$addFields': {'main_photo_url': {'$let': {'vars': {'primaryPhoto': {'$arrayElemAt': [{'$filter': {'input': '$photos', 'as': 'p', 'cond': {'$eq': ['$$p.Is Primary', True]}}}, 0]}, 'firstPhoto': {'$arrayElemAt': ['$photos', 0]}}, 'in': {'$ifNull': ['$$primaryPhoto.Photo URL', '$$firstPhoto.Photo URL']}}}}},
-        {'$project': {'photos': 0, 'special_price_info': 0, 'special_price_obj': 0}}
-    ])
-    
-    items = list(items_collection.aggregate(pipeline))
-    
     for item in items:
-        item["_id"] = str(item["_id"])
         item['available_stock'] = stock_map.get(item.get('Item ID'), 0)
+        item['thumbnail_url'] = image_url(item.get('main_photo_url'), 'list')
 
-    items = clean_nan_values(items)
-    
-    return jsonify({
+    if cursor_mode:
+        return jsonify({
+            'items': items,
+            'pagination': {'per_page': per_page, 'next_cursor': next_cursor, 'has_next': next_cursor is not None}
+        })
+
+    response = {
         'items': items,
         'pagination': {
             'page': page, 'per_page': per_page, 'total_items': total_items,
-            'total_pages': total_pages, 'has_prev': page > 1, 'has_next': page < total_pages
+            'total_is_exact': total_is_exact, 'total_pages': total_pages, 'has_prev': page > 1, 'has_next': page < total_pages
         }
-    })
+    }
+    if facets_mode:
+        response['facets'] = {
+            'categories': [
+                {'name': entry['_id'], 'count': entry['count']}
+                for entry in result['categories'] if entry['_id'] not in (None, '')
+            ],
+            'price_histogram': [
+                {'min': bucket['_id']['min'], 'max': bucket['_id']['max'], 'count': bucket['count']}
+                for bucket in result['price_histogram']
+            ]
+        }
+    return jsonify(response)
+
+@items_bp.route("/stock", methods=["GET"])
+def get_items_stock():
+    """Retorna a disponibilidade dos IDs informados em ?ids=1,2,3"""
+    try:
+        item_ids = parse_item_ids(request.args.get('ids', ''))
+    except ValueError as e:
+        return jsonify({"error": f"Parâmetro 'ids' inválido: {e}"}), 400
+    stock = stock_lookup.get_many(item_ids)
+    return jsonify({str(item_id): available for item_id, available in stock.items()})
+
+@items_bp.route("/batch", methods=["GET"])
+def get_items_batch():
+    """Retorna {Item ID: item} para os IDs informados em ?ids=1,2,3 (uma única consulta $in)"""
+    try:
+        item_ids = parse_item_ids(request.args.get('ids', ''))
+    except ValueError as e:
+        return jsonify({"error": f"Parâmetro 'ids' inválido: {e}"}), 400
+
+    items = list(get_items_collection().find({"Item ID": {"$in": item_ids}}, ITEM_BATCH_PROJECTION))
+    client_price_book.apply(optional_user_id(), items)
+    stock_map = stock_snapshot.get_map()
+    for item in items:
+        item['available_stock'] = stock_map.get(item['Item ID'], 0)
+        item['thumbnail_url'] = image_url(item.get('main_photo_url'), 'list')
+    return jsonify({str(item['Item ID']): item for item in items})
+
+@items_bp.route("/photos/batch", methods=["GET"])
+def get_photos_batch():
+    """Retorna {Item ID: [fotos]} para os IDs informados em ?ids=1,2,3, com a principal primeiro"""
+    try:
+        item_ids = parse_item_ids(request.args.get('ids', ''))
+    except ValueError as e:
+        return jsonify({"error": f"Parâmetro 'ids' inválido: {e}"}), 400
+
+    query = {"Item ID": {"$in": item_ids}, "Photo URL": {"$exists": True, "$ne": ""}}
+    photos = get_fotos_collection().find(query, PHOTO_BATCH_PROJECTION).sort([("Item ID", 1), ("Is Primary", -1)])
+    photos_by_item = {str(item_id): [] for item_id in item_ids}
+    for photo in photos:
+        photo['detail_url'] = image_url(photo['Photo URL'], 'detail')
+        photos_by_item.setdefault(str(photo['Item ID']), []).append(photo)
+    return jsonify(photos_by_item)
+
+@items_bp.route("/suggest", methods=["GET"])
+def suggest_items():
+    """Sugestões de autocompletar (categorias e produtos) para ?q=, servidas do índice em memória"""
+    query = request.args.get('q', '')
+    limit = request.args.get('limit', DEFAULT_SUGGESTIONS, type=int)
+    return jsonify({"query": query, "suggestions": suggest_index.suggest(query, limit)})
+
+@items_bp.route("/suggest/status", methods=["GET"])
+def get_suggest_status():
+    """Retorna o tamanho e a versão do catálogo do índice de sugestões"""
+    return jsonify(suggest_index.status())
+
+def export_lines(query, user_id):
+    """Gera o NDJSON do catálogo em blocos de EXPORT_BATCH_SIZE itens, com estoque e foto principal."""
+    cursor = get_items_collection().find(query, ITEM_BATCH_PROJECTION).sort('Item ID', 1).batch_size(EXPORT_BATCH_SIZE)
+    batch = []
+    for item in cursor:
+        batch.append(item)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            yield export_batch(batch, user_id)
+            batch = []
+    if batch:
+        yield export_batch(batch, user_id)
+
+def export_batch(items, user_id):
+    stock_map = stock_snapshot.get_map()
+    # Itens anteriores ao resumo de fotos (sem 'photo_count') buscam a foto principal em uma única consulta
+    missing_summary = [item['Item ID'] for item in items if 'photo_count' not in item]
+    if missing_summary:
+        photos = get_fotos_collection().find(
+            {"Item ID": {"$in": missing_summary}, "Photo URL": {"$exists": True, "$ne": ""}},
+            {'_id': 0, 'Item ID': 1, 'Photo URL': 1}
+        ).sort([("Item ID", 1), ("Is Primary", -1)])
+        main_photos = {}
+        for photo in photos:
+            main_photos.setdefault(photo['Item ID'], photo['Photo URL'])
+        for item in items:
+            if item['Item ID'] in main_photos:
+                item['main_photo_url'] = main_photos[item['Item ID']]
+
+    client_price_book.apply(user_id, items)
+    lines = []
+    for item in items:
+        item['available_stock'] = stock_map.get(item['Item ID'], 0)
+        item['thumbnail_url'] = image_url(item.get('main_photo_url'), 'list')
+        lines.append(dumps(item))
+    lines.append('')
+    return '\n'.join(lines)
+
+@items_bp.route("/export.ndjson", methods=["GET"])
+def export_items_ndjson():
+    """
+    Exporta o catálogo inteiro em NDJSON (um item por linha), em streaming e ordenado por Item ID.
+    Aceita ?category= e ?after=<Item ID> para retomar uma exportação interrompida.
+    """
+    query = {"Item ID": {"$exists": True}}
+    if request.args.get('category'):
+        query['Category'] = request.args['category']
+    if request.args.get('after'):
+        try:
+            query['Item ID'] = {"$gt": int(request.args['after'])}
+        except ValueError:
+            return jsonify({"error": "Parâmetro 'after' inválido"}), 400
+
+    response = Response(stream_with_context(export_lines(query, optional_user_id())), mimetype='application/x-ndjson')
+    response.headers['Content-Disposition'] = 'attachment; filename=catalog.ndjson'
+    # Evita que um proxy (nginx) acumule a resposta inteira antes de repassá-la
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@items_bp.route("/stock/status", methods=["GET"])
+def get_stock_status():
+    """Retorna a idade e o tempo de atualização do snapshot de estoque"""
+    return jsonify(stock_snapshot.status())
 
 @items_bp.route("/categories", methods=["GET"])
+@conditional_get()
 def get_categories():
-    """Retorna todas as categorias únicas"""
-    categories = get_items_collection().distinct('Category')
-    categories = [cat for cat in categories if cat is not None and cat != '']
-    return jsonify(sorted(categories))
+    """Retorna todas as categorias únicas (com ?counts=1, também a quantidade de itens de cada uma)"""
+    categories = category_registry.categories()
+    if request.args.get('counts'):
+        return jsonify([{'name': name, 'count': count} for name, count in categories])
+    return jsonify([name for name, _ in categories])
 
 
 @items_bp.route("/<item_id>", methods=["GET"])
 def get_item_by_id(item_id):
     item = get_items_collection().find_one({"Item ID": int(item_id)})
     if item:
-        item["_id"] = str(item["_id"])
-        item = clean_nan_values(item)
+        item['available_stock'] = stock_lookup.get(item["Item ID"])
+        item['detail_photo_url'] = image_url(item.get('main_photo_url'), 'detail')
         return jsonify(item)
     return jsonify({"message": "Item not found"}), 404
 
 @items_bp.route("/<int:item_id>/photos", methods=["GET"])
+@conditional_get()
 def get_item_photos(item_id):
     """ Retorna todas as fotos de um produto específico, garantindo que a URL exista. """
     try:
@@ -155,10 +354,9 @@ def get_item_photos(item_id):
         
         # Executa a busca com a query aprimorada
         photos = list(fotos_collection.find(query).sort("Is Primary", -1))
-        
-        # Converte ObjectId para string para ser compatível com JSON
         for photo in photos:
-            photo['_id'] = str(photo['_id'])
+            photo['detail_url'] = image_url(photo['Photo URL'], 'detail')
+            photo['zoom_url'] = image_url(photo['Photo URL'], 'zoom')
         
         return jsonify(photos)
     
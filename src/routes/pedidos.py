@@ -3,6 +3,8 @@ from src.models.models import get_pedidos_collection
 from src.routes.auth import require_auth
 from src.services.sankhya_service import sankhya_service
 from src.models.models import get_clients_collection, get_users_collection
+from src.services.order_listing import list_order_summaries, parse_per_page
+from src.services.pagination import InvalidCursorError
 from datetime import datetime
 from bson import ObjectId
 
@@ -11,7 +13,11 @@ pedidos_bp = Blueprint("pedidos", __name__)
 @pedidos_bp.route("/", methods=["GET"])
 @require_auth
 def get_all_pedidos():
-    """ Retorna os pedidos do usuário que não foram 'excluídos' por ele. """
+    """
+    Retorna uma página dos pedidos do usuário que não foram 'excluídos' por ele.
+    Cada pedido vem resumido (número, data, totais e status); os itens ficam no detalhe.
+    Parâmetros: ?cursor= (next_cursor da página anterior) e ?per_page=.
+    """
     user_id = request.current_user["user_id"]
     
     # Filtra pedidos que pertencem ao usuário E onde o user_id NÃO está no array 'deleted_by_users'
@@ -19,11 +25,29 @@ def get_all_pedidos():
         "user_id": user_id,
         "deleted_by_users": {"$ne": user_id}
     }
-    pedidos = list(get_pedidos_collection().find(query).sort("Data", -1)) # Ordena por mais recente
+    try:
+        pedidos, next_cursor = list_order_summaries(
+            query, cursor=request.args.get("cursor"), per_page=parse_per_page(request.args.get("per_page"))
+        )
+    except InvalidCursorError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"orders": pedidos, "next_cursor": next_cursor})
+
+@pedidos_bp.route("/numero/<int:order_number>", methods=["GET"])
+@require_auth
+def get_pedido_by_number(order_number):
+    """ Retorna os detalhes (com os itens) de um pedido do usuário pelo número. """
+    user_id = request.current_user["user_id"]
     
-    for pedido in pedidos:
-        pedido["_id"] = str(pedido["_id"])
-    return jsonify(pedidos)
+    pedido = get_pedidos_collection().find_one({
+        "Order": order_number,
+        "user_id": user_id,
+        "deleted_by_users": {"$ne": user_id}
+    })
+    
+    if pedido:
+        return jsonify(pedido)
+    return jsonify({"message": "Pedido não encontrado"}), 404
 
 @pedidos_bp.route("/<string:order_id>", methods=["GET"])
 @require_auth
@@ -38,7 +62,6 @@ def get_pedido_by_id(order_id):
     })
     
     if pedido:
-        pedido["_id"] = str(pedido["_id"])
         return jsonify(pedido)
     return jsonify({"message": "Pedido não encontrado"}), 404
 
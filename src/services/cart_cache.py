@@ -0,0 +1,281 @@
+import json
+import os
+import threading
+import time
+from pymongo import ReplaceOne, DeleteMany
+from src.json_provider import dumps
+from src.models.models import get_cart_collection
+from src.services.cart_totals import totals_from_lines, normalize_line_weight
+from src.services.cart_summary import set_summary
+
+# O cliente Redis é opcional: só é necessário com CART_CACHE_BACKEND=redis
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Validade padrão (em segundos) de um carrinho sem acesso no cache
+DEFAULT_CART_TTL = 1800
+# Atraso máximo padrão (em segundos) entre uma alteração e sua gravação no MongoDB
+DEFAULT_FLUSH_INTERVAL = 1
+
+DIRTY_KEY = "cart:dirty"
+
+
+def next_version(previous):
+    """
+    Próxima versão de um carrinho: o horário em microssegundos, sempre maior que a anterior.
+    Não recomeça quando o carrinho é recarregado do MongoDB, então uma marca de pendência
+    nova nunca é confundida com a de uma versão já gravada. Cabe exatamente no score
+    (double) de um sorted set do Redis.
+    """
+    return max(previous + 1, int(time.time() * 1000000))
+
+
+class MemoryCartBackend:
+    """
+    Armazenamento em memória do próprio processo.
+    Só é consistente com um único worker; com vários, use o backend Redis.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._values = {}
+        self._dirty = {}
+        self._flush_locks = {}
+        self._lock = threading.Lock()
+
+    def _current(self, key):
+        # Carrinhos pendentes não expiram: só voltam a ter validade depois de gravados
+        entry = self._values.get(key)
+        if entry is None or (entry[1] < time.monotonic() and entry[2] not in self._dirty):
+            return None
+        return entry[0]
+
+    def get(self, key):
+        with self._lock:
+            value = self._current(key)
+            if value is not None:
+                entry = self._values[key]
+                self._values[key] = (value, time.monotonic() + self.ttl, entry[2])
+            return value
+
+    def update(self, key, member, function):
+        """Aplica function(valor atual) -> (novo valor, versão, resultado) atomicamente e marca o carrinho como pendente."""
+        with self._lock:
+            value, version, result = function(self._current(key))
+            self._values[key] = (value, time.monotonic() + self.ttl, member)
+            if version is not None:
+                self._dirty[member] = version
+            return result
+
+    def delete(self, key, member):
+        with self._lock:
+            self._values.pop(key, None)
+            self._dirty.pop(member, None)
+
+    def flush_lock(self, member):
+        with self._lock:
+            return self._flush_locks.setdefault(member, threading.Lock())
+
+    def dirty(self):
+        with self._lock:
+            return list(self._dirty.items())
+
+    def clear_dirty(self, key, member, version):
+        with self._lock:
+            if self._dirty.get(member) == version:
+                del self._dirty[member]
+                entry = self._values.get(key)
+                if entry is not None:
+                    self._values[key] = (entry[0], time.monotonic() + self.ttl, member)
+
+
+class RedisCartBackend:
+    """Armazenamento em um servidor que fala o protocolo do Redis, compartilhado por todos os workers."""
+
+    # Renova a validade só de carrinhos que já têm uma: os pendentes ficam sem expiração até serem gravados
+    GET_SCRIPT = """
+    local value = redis.call('GET', KEYS[1])
+    if value and redis.call('TTL', KEYS[1]) >= 0 then
+        redis.call('EXPIRE', KEYS[1], ARGV[1])
+    end
+    return value
+    """
+
+    def __init__(self, url, ttl):
+        if redis is None:
+            raise RuntimeError("CART_CACHE_BACKEND=redis requer o pacote 'redis'")
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url)
+        self._get = self._client.register_script(self.GET_SCRIPT)
+
+    def get(self, key):
+        value = self._get(keys=[key], args=[self.ttl])
+        return value.decode("utf-8") if value is not None else None
+
+    def update(self, key, member, function):
+        def transaction(pipe):
+            current = pipe.get(key)
+            value, version, result = function(current.decode("utf-8") if current is not None else None)
+            pipe.multi()
+            if version is not None:
+                # Pendente: sem expiração até a gravação no MongoDB (clear_dirty devolve a validade)
+                pipe.set(key, value)
+                pipe.zadd(DIRTY_KEY, {member: version})
+            else:
+                pipe.set(key, value, ex=self.ttl, nx=True)
+            return result
+        # WATCH na chave: se outro worker alterar o carrinho no meio, a função é reaplicada
+        return self._client.transaction(transaction, key, value_from_callable=True)
+
+    def delete(self, key, member):
+        pipe = self._client.pipeline()
+        pipe.delete(key)
+        pipe.zrem(DIRTY_KEY, member)
+        pipe.execute()
+
+    def flush_lock(self, member):
+        # Impede que dois workers gravem versões diferentes do mesmo carrinho fora de ordem
+        return self._client.lock(f"cart:flush:{member}", timeout=30, blocking_timeout=30)
+
+    def dirty(self):
+        return [(member.decode("utf-8"), int(version)) for member, version in self._client.zrange(DIRTY_KEY, 0, -1, withscores=True)]
+
+    def clear_dirty(self, key, member, version):
+        def transaction(pipe):
+            score = pipe.zscore(DIRTY_KEY, member)
+            pipe.multi()
+            if score is not None and int(score) == version:
+                pipe.zrem(DIRTY_KEY, member)
+                pipe.expire(key, self.ttl)
+        self._client.transaction(transaction, DIRTY_KEY)
+
+
+class CartCache:
+    """
+    Cache opcional dos carrinhos com gravação posterior (write-behind) no MongoDB.
+
+    Cada carrinho ativo fica no cache como {version, lines, totals}. As leituras de um
+    carrinho já carregado não consultam o MongoDB; as alterações são aplicadas no cache,
+    que recalcula os totais, e uma thread em segundo plano grava os carrinhos pendentes
+    na coleção cart a cada CART_CACHE_FLUSH_INTERVAL segundos. Um carrinho com alterações
+    pendentes não expira (CART_CACHE_TTL) até ser gravado.
+    """
+
+    def __init__(self, backend=None, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    @staticmethod
+    def _key(user_id):
+        return f"cart:{user_id}"
+
+    @staticmethod
+    def _load(user_id):
+        lines = [normalize_line_weight(line) for line in get_cart_collection().find({"user_id": user_id})]
+        return {"user_id": user_id, "version": 0, "lines": lines, "totals": totals_from_lines(lines)}
+
+    def get(self, user_id):
+        """Retorna {version, lines, totals} do carrinho, carregando-o do MongoDB na primeira vez."""
+        self._ensure_worker()
+        raw = self.backend.get(self._key(user_id))
+        if raw is not None:
+            return json.loads(raw)
+
+        def load(current):
+            if current is not None:
+                return current, None, json.loads(current)
+            cart = self._load(user_id)
+            return dumps(cart), None, json.loads(dumps(cart))
+        return self.backend.update(self._key(user_id), str(user_id), load)
+
+    def mutate(self, user_id, function):
+        """
+        Aplica function(lines) -> resultado às linhas do carrinho, recalcula os totais e
+        agenda a gravação no MongoDB. Retorna o resultado de function.
+        """
+        self._ensure_worker()
+
+        def apply(current):
+            cart = json.loads(current) if current is not None else json.loads(dumps(self._load(user_id)))
+            result = function(cart["lines"])
+            cart["version"] = next_version(cart["version"])
+            cart["totals"] = totals_from_lines(cart["lines"])
+            return dumps(cart), cart["version"], result
+        return self.backend.update(self._key(user_id), str(user_id), apply)
+
+    def persist(self, user_id, lines):
+        """Grava as linhas do carrinho na coleção cart, removendo as que saíram do carrinho."""
+        operations = []
+        for line in lines:
+            # Carrinhos carregados antes de backfill_line_weights ainda podem ter o peso antigo
+            document = normalize_line_weight({field: value for field, value in line.items() if field != "_id"})
+            operations.append(ReplaceOne({"user_id": document["user_id"], "Item ID": document["Item ID"]}, document, upsert=True))
+        operations.append(DeleteMany({"user_id": user_id, "Item ID": {"$nin": [line["Item ID"] for line in lines]}}))
+        get_cart_collection().bulk_write(operations, ordered=True)
+
+    def flush(self, user_id=None):
+        """Grava no MongoDB os carrinhos pendentes (ou só o do usuário informado). Retorna quantos foram gravados."""
+        flushed = 0
+        for member, version in self.backend.dirty():
+            if user_id is not None and member != str(user_id):
+                continue
+            with self.backend.flush_lock(member):
+                raw = self.backend.get(self._key(member))
+                if raw is None:
+                    # Carrinhos pendentes não expiram; sem valor, a chave foi removida fora da aplicação
+                    print(f"Carrinho pendente {member} não encontrado no cache; alterações não gravadas foram perdidas")
+                    self.backend.clear_dirty(self._key(member), member, version)
+                    continue
+                cart = json.loads(raw)
+                self.persist(cart["user_id"], cart["lines"])
+                set_summary(cart["user_id"], cart["totals"])
+                # Só sai da lista se nenhuma alteração chegou enquanto gravávamos
+                self.backend.clear_dirty(self._key(member), member, cart["version"])
+            flushed += 1
+        return flushed
+
+    def drop(self, user_id):
+        """Descarta o carrinho do cache (sem gravá-lo)."""
+        self.backend.delete(self._key(user_id), str(user_id))
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Erro ao gravar os carrinhos pendentes no MongoDB: {e}")
+
+    def _ensure_worker(self):
+        # A thread é iniciada sob demanda e recriada após um fork (workers do gunicorn)
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="cart-cache-flush", daemon=True)
+            self._thread.start()
+
+
+def _build_backend():
+    backend = os.getenv("CART_CACHE_BACKEND", "").lower()
+    ttl = int(os.getenv("CART_CACHE_TTL", DEFAULT_CART_TTL))
+    if backend == "memory":
+        return MemoryCartBackend(ttl)
+    if backend == "redis":
+        return RedisCartBackend(os.getenv("CART_CACHE_URL", "redis://localhost:6379/0"), ttl)
+    return None
+
+
+# Instância global; desativada (backend None) a menos que CART_CACHE_BACKEND seja definido
+cart_cache = CartCache(_build_backend(), float(os.getenv("CART_CACHE_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL)))
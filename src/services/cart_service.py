@@ -0,0 +1,309 @@
+import uuid
+from datetime import datetime
+from pymongo import ReturnDocument, DeleteOne, UpdateOne
+from pymongo.errors import DuplicateKeyError, BulkWriteError
+from src.models.models import get_cart_collection
+from src.services.cart_totals import to_number, calculate_volume, unit_volume, totals_from_lines, stored_number, UNIT_VOLUME_EXPRESSION
+from src.services.cart_cache import cart_cache
+from src.services.cart_summary import apply_summary_delta, apply_line_change, set_summary, read_summary
+
+# Campos do produto copiados para a linha do carrinho
+CART_ITEM_PROJECTION = {
+    "_id": 0, "Item ID": 1, "Name": 1, "Description": 1, "Category": 1, "Shape": 1,
+    "Length": 1, "Width": 1, "Height": 1, "Weight": 1, "Sale Price": 1
+}
+
+
+def merge_duplicate_lines(collection=None):
+    """
+    Junta as linhas repetidas (mesmo usuário e produto), somando quantidades e totais
+    na mais antiga. Necessário antes de criar o índice único (user_id, Item ID),
+    declarado em src/models/indexes.py. Retorna as linhas removidas.
+    """
+    collection = collection if collection is not None else get_cart_collection()
+    pipeline = [
+        {"$sort": {"_id": 1}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "item_id": "$Item ID"},
+            "ids": {"$push": "$_id"},
+            "amount": {"$sum": "$Amount"},
+            "total_price": {"$sum": "$Total price"},
+            "total_weight": {"$sum": "$Total weight Kg"},
+            "total_volume": {"$sum": "$Total volume m3"},
+            "count": {"$sum": 1}
+        }},
+        {"$match": {"count": {"$gt": 1}}}
+    ]
+    operations = []
+    for group in collection.aggregate(pipeline, allowDiskUse=True):
+        keep, *duplicates = group["ids"]
+        operations.append(UpdateOne({"_id": keep}, {"$set": {
+            "Amount": group["amount"],
+            "Total price": group["total_price"],
+            "Total weight Kg": group["total_weight"],
+            "Total volume m3": group["total_volume"]
+        }}))
+        operations.extend(DeleteOne({"_id": duplicate}) for duplicate in duplicates)
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+    return sum(isinstance(operation, DeleteOne) for operation in operations)
+
+
+def new_line_fields(user_id, item, price):
+    """Campos fixos de uma nova linha do carrinho (copiados do produto no momento da inclusão)."""
+    return {
+        "Inventory ID": str(uuid.uuid4())[:8],
+        "Description": item.get("Description", ""),
+        "Category": item.get("Category", ""),
+        "Name": item.get("Name", ""),
+        "Shape": item.get("Shape", "box"),
+        "Length": item.get("Length", 0),
+        "Width": item.get("Width", 0),
+        "Height": item.get("Height", 0),
+        "Weight": to_number(item.get("Weight", 0)),  # Peso unitário
+        "Volume m3": calculate_volume(item),  # Volume unitário
+        "Sale Price": to_number(price),
+        "Client": user_id
+    }
+
+
+def get_cart_lines(user_id):
+    """Linhas do carrinho do usuário (do cache, quando ativo)."""
+    if cart_cache.enabled:
+        return cart_cache.get(user_id)["lines"]
+    return list(get_cart_collection().find({"user_id": user_id}))
+
+
+def get_cart_totals(user_id):
+    """Totais do carrinho (valor, peso e cubagem); com o cache ativo, já vêm calculados."""
+    if cart_cache.enabled:
+        return cart_cache.get(user_id)["totals"]
+    return read_summary(user_id)
+
+
+def add_cart_line(user_id, item, amount, price):
+    """
+    Soma 'amount' unidades do produto ao carrinho em uma única operação atômica,
+    criando a linha se ela não existir. Retorna (linha atualizada, criada).
+    'amount' deve ser um inteiro positivo (validado pela rota com parse_amount).
+    """
+    fields = new_line_fields(user_id, item, price)
+    price = fields["Sale Price"]
+    weight = fields["Weight"]
+    volume = fields["Volume m3"]
+    now = datetime.now().isoformat()
+
+    if cart_cache.enabled:
+        def add(lines):
+            for line in lines:
+                if line["Item ID"] == item["Item ID"]:
+                    line["Amount"] += amount
+                    line["Total price"] = line.get("Total price", 0) + price * amount
+                    line["Total weight Kg"] = line.get("Total weight Kg", 0) + weight * amount
+                    line["Total volume m3"] = line.get("Total volume m3", 0) + volume * amount
+                    line["DateTime"] = now
+                    return line, False
+            line = dict(fields, **{
+                "Item ID": item["Item ID"], "user_id": user_id, "DateTime": now, "Amount": amount,
+                "Total price": price * amount, "Total weight Kg": weight * amount, "Total volume m3": volume * amount
+            })
+            lines.append(line)
+            return line, True
+        return cart_cache.mutate(user_id, add)
+
+    update = {
+        "$inc": {
+            "Amount": amount,
+            "Total price": price * amount,
+            "Total weight Kg": weight * amount,
+            "Total volume m3": volume * amount
+        },
+        "$set": {"DateTime": now},
+        "$setOnInsert": fields
+    }
+    query = {"user_id": user_id, "Item ID": item["Item ID"]}
+    try:
+        line = get_cart_collection().find_one_and_update(query, update, upsert=True, return_document=ReturnDocument.AFTER)
+    except DuplicateKeyError:
+        # Dois upserts simultâneos da mesma linha: o outro a criou, agora basta incrementá-la
+        line = get_cart_collection().find_one_and_update(query, update, return_document=ReturnDocument.AFTER)
+    created = line["Inventory ID"] == fields["Inventory ID"]
+    apply_summary_delta(user_id, items=int(created), value=price * amount, weight=weight * amount, volume=volume * amount)
+    return line, created
+
+
+def add_cart_lines(user_id, entries):
+    """
+    Soma várias linhas ao carrinho de uma vez. 'entries' é uma lista de (produto, quantidade, preço)
+    com produtos distintos. Usa um único bulk_write não ordenado (ou uma única alteração do cache).
+    Retorna {Item ID: 'added' | 'updated' | mensagem de erro}.
+    """
+    now = datetime.now().isoformat()
+    prepared = []
+    for item, amount, price in entries:
+        fields = new_line_fields(user_id, item, price)
+        prepared.append((item["Item ID"], amount, fields))
+
+    if cart_cache.enabled:
+        def add_all(lines):
+            by_item = {line["Item ID"]: line for line in lines}
+            outcome = {}
+            for item_id, amount, fields in prepared:
+                line = by_item.get(item_id)
+                if line is None:
+                    line = dict(fields, **{
+                        "Item ID": item_id, "user_id": user_id, "Amount": 0,
+                        "Total price": 0, "Total weight Kg": 0, "Total volume m3": 0
+                    })
+                    lines.append(line)
+                    by_item[item_id] = line
+                    outcome[item_id] = "added"
+                else:
+                    outcome[item_id] = "updated"
+                line["Amount"] += amount
+                line["Total price"] = line.get("Total price", 0) + fields["Sale Price"] * amount
+                line["Total weight Kg"] = line.get("Total weight Kg", 0) + fields["Weight"] * amount
+                line["Total volume m3"] = line.get("Total volume m3", 0) + fields["Volume m3"] * amount
+                line["DateTime"] = now
+            return outcome
+        return cart_cache.mutate(user_id, add_all)
+
+    operations = [
+        UpdateOne(
+            {"user_id": user_id, "Item ID": item_id},
+            {
+                "$inc": {
+                    "Amount": amount,
+                    "Total price": fields["Sale Price"] * amount,
+                    "Total weight Kg": fields["Weight"] * amount,
+                    "Total volume m3": fields["Volume m3"] * amount
+                },
+                "$set": {"DateTime": now},
+                "$setOnInsert": fields
+            },
+            upsert=True
+        )
+        for item_id, amount, fields in prepared
+    ]
+    if not operations:
+        return {}
+
+    try:
+        result = get_cart_collection().bulk_write(operations, ordered=False)
+        upserted = set(result.upserted_ids)
+        failed = {}
+    except BulkWriteError as e:
+        # Sem ordem, as demais operações são aplicadas mesmo que algumas falhem
+        upserted = {entry["index"] for entry in e.details.get("upserted", [])}
+        failed = {error["index"]: error.get("errmsg", "Erro ao gravar") for error in e.details.get("writeErrors", [])}
+
+    outcome = {}
+    delta = {"items": 0, "value": 0.0, "weight": 0.0, "volume": 0.0}
+    for index, (item_id, amount, fields) in enumerate(prepared):
+        if index in failed:
+            outcome[item_id] = failed[index]
+            continue
+        outcome[item_id] = "added" if index in upserted else "updated"
+        delta["items"] += int(index in upserted)
+        delta["value"] += fields["Sale Price"] * amount
+        delta["weight"] += fields["Weight"] * amount
+        delta["volume"] += fields["Volume m3"] * amount
+    apply_summary_delta(user_id, **delta)
+    return outcome
+
+
+def set_cart_line_amount(user_id, inventory_id, amount):
+    """
+    Define a quantidade de uma linha do carrinho e recalcula seus totais a partir do
+    preço e do peso unitários gravados nela, em uma única operação. Retorna a linha ou None.
+    'amount' deve ser um inteiro positivo (validado pela rota com parse_amount).
+    """
+    now = datetime.now().isoformat()
+    if cart_cache.enabled:
+        def set_amount(lines):
+            for line in lines:
+                if line.get("Inventory ID") == inventory_id:
+                    line["Amount"] = amount
+                    line["Total price"] = to_number(line.get("Sale Price", 0)) * amount
+                    line["Total weight Kg"] = to_number(line.get("Weight", 0)) * amount
+                    line["Total volume m3"] = unit_volume(line) * amount
+                    line["DateTime"] = now
+                    return line
+            return None
+        return cart_cache.mutate(user_id, set_amount)
+
+    # Em um pipeline, strings com '$' e objetos seriam lidos como campos/expressões: o valor vai como $literal
+    literal_amount = {"$literal": amount}
+    update = [
+        {"$set": {"Volume m3": UNIT_VOLUME_EXPRESSION}},
+        {"$set": {
+            "Amount": literal_amount,
+            "Total price": {"$multiply": [stored_number("Sale Price"), literal_amount]},
+            "Total weight Kg": {"$multiply": [stored_number("Weight"), literal_amount]},
+            "Total volume m3": {"$multiply": ["$Volume m3", literal_amount]},
+            "DateTime": {"$literal": now}
+        }}
+    ]
+    # A versão anterior dá a variação para o resumo; a nova é reconstruída com as mesmas fórmulas
+    before = get_cart_collection().find_one_and_update(
+        {"Inventory ID": inventory_id, "user_id": user_id},
+        update,
+        return_document=ReturnDocument.BEFORE
+    )
+    if before is None:
+        return None
+    after = dict(before)
+    after.update({
+        "Amount": amount,
+        "Volume m3": unit_volume(before),
+        "Total price": to_number(before.get("Sale Price", 0)) * amount,
+        "Total weight Kg": to_number(before.get("Weight", 0)) * amount,
+        "Total volume m3": unit_volume(before) * amount,
+        "DateTime": now
+    })
+    apply_line_change(user_id, before, after)
+    return after
+
+
+def remove_cart_line(user_id, inventory_id):
+    """Remove uma linha do carrinho. Retorna True se ela existia."""
+    if cart_cache.enabled:
+        def remove(lines):
+            for index, line in enumerate(lines):
+                if line.get("Inventory ID") == inventory_id:
+                    del lines[index]
+                    return True
+            return False
+        return cart_cache.mutate(user_id, remove)
+    removed = get_cart_collection().find_one_and_delete({"Inventory ID": inventory_id, "user_id": user_id})
+    if removed is None:
+        return False
+    apply_line_change(user_id, removed, None)
+    return True
+
+
+def clear_cart_lines(user_id):
+    """Esvazia o carrinho. Retorna a quantidade de linhas removidas."""
+    if cart_cache.enabled:
+        def clear(lines):
+            removed = len(lines)
+            lines.clear()
+            return removed
+        return cart_cache.mutate(user_id, clear)
+    removed = get_cart_collection().delete_many({"user_id": user_id}).deleted_count
+    set_summary(user_id, totals_from_lines([]))
+    return removed
+
+
+def flush_cart(user_id):
+    """Garante que a coleção cart reflita o carrinho do usuário (grava o que estiver pendente no cache)."""
+    if cart_cache.enabled:
+        cart_cache.flush(user_id)
+
+
+def discard_cart(user_id):
+    """Apaga o carrinho do usuário depois que ele virou pedido."""
+    get_cart_collection().delete_many({"user_id": user_id})
+    set_summary(user_id, totals_from_lines([]))
+    if cart_cache.enabled:
+        cart_cache.drop(user_id)
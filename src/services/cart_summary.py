@@ -0,0 +1,175 @@
+from datetime import datetime
+from pymongo import UpdateOne, DeleteOne
+from src.models.models import get_cart_collection, get_cart_summaries_collection
+from src.services.cart_totals import (
+    to_number, line_totals, totals_from_lines, format_totals, stored_number, UNIT_VOLUME_EXPRESSION
+)
+
+# Diferença abaixo da qual um resumo é considerado correto (erros de arredondamento do $inc)
+RECONCILE_TOLERANCE = 1e-6
+SUMMARY_FIELDS = ("total_items", "total_value", "total_weight", "total_volume")
+
+
+def _initialize_summary(user_id):
+    """Cria o resumo a partir das linhas atuais do carrinho, se ele ainda não existir."""
+    lines = list(get_cart_collection().find({"user_id": user_id}))
+    totals = totals_from_lines(lines)
+    get_cart_summaries_collection().update_one(
+        {"_id": user_id},
+        {"$setOnInsert": {
+            "total_items": totals["total_items"],
+            "total_value": totals["total_value"],
+            "total_weight": totals["total_weight"],
+            "total_volume": totals["total_volume"],
+            "updated_at": datetime.utcnow()
+        }},
+        upsert=True
+    )
+
+
+def apply_summary_delta(user_id, items=0, value=0.0, weight=0.0, volume=0.0):
+    """Soma as variações de uma alteração do carrinho ao resumo do usuário com $inc."""
+    result = get_cart_summaries_collection().update_one(
+        {"_id": user_id},
+        {"$inc": {"total_items": items, "total_value": value, "total_weight": weight, "total_volume": volume},
+         "$set": {"updated_at": datetime.utcnow()}}
+    )
+    if result.matched_count == 0:
+        # Sem resumo ainda: um $inc com upsert partiria de zero e ignoraria as linhas já existentes.
+        # As linhas já incluem esta alteração, então basta criá-lo a partir delas.
+        _initialize_summary(user_id)
+
+
+def apply_line_change(user_id, before, after):
+    """Aplica ao resumo a diferença entre a linha antes e depois da alteração (None = inexistente)."""
+    old = line_totals(before) if before else (0.0, 0.0, 0.0)
+    new = line_totals(after) if after else (0.0, 0.0, 0.0)
+    apply_summary_delta(
+        user_id,
+        items=(after is not None) - (before is not None),
+        value=new[0] - old[0],
+        weight=new[1] - old[1],
+        volume=new[2] - old[2]
+    )
+
+
+def set_summary(user_id, totals):
+    """Grava o resumo com valores exatos (carrinho esvaziado ou gravado a partir do cache)."""
+    get_cart_summaries_collection().update_one(
+        {"_id": user_id},
+        {"$set": {**{field: totals[field] for field in SUMMARY_FIELDS}, "updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+
+
+def read_summary(user_id):
+    """Totais do carrinho em uma única leitura por chave, independente da quantidade de linhas."""
+    summary = get_cart_summaries_collection().find_one({"_id": user_id})
+    if summary is None:
+        _initialize_summary(user_id)
+        summary = get_cart_summaries_collection().find_one({"_id": user_id}) or {}
+    return format_totals(*(summary.get(field, 0) for field in SUMMARY_FIELDS))
+
+
+def backfill_line_volumes(collection=None):
+    """Grava 'Volume m3' e 'Total volume m3' nas linhas antigas do carrinho, que só tinham as dimensões."""
+    collection = collection if collection is not None else get_cart_collection()
+    result = collection.update_many(
+        {"Total volume m3": {"$exists": False}},
+        [
+            {"$set": {"Volume m3": UNIT_VOLUME_EXPRESSION}},
+            {"$set": {"Total volume m3": {"$multiply": ["$Volume m3", stored_number("Amount")]}}}
+        ]
+    )
+    return result.modified_count
+
+
+# Linhas com o peso total gravado no nome antigo ('Total wheight Kg', escrito ao somar ou
+# editar uma linha existente) ou sem peso total: 'Total weight Kg' delas está desatualizado
+LEGACY_WEIGHT_FILTER = {"$or": [{"Total wheight Kg": {"$exists": True}}, {"Total weight Kg": {"$exists": False}}]}
+
+
+def backfill_line_weights(collection=None):
+    """
+    Recalcula 'Total weight Kg' (Weight × Amount) nas linhas antigas do carrinho e remove
+    'Total wheight Kg'. Linhas sem 'Weight' recebem o peso atual do produto.
+    Retorna os user_id dos carrinhos alterados.
+    """
+    collection = collection if collection is not None else get_cart_collection()
+    lines = list(collection.find(LEGACY_WEIGHT_FILTER, {"user_id": 1, "Item ID": 1, "Weight": 1}))
+    if not lines:
+        return set()
+
+    missing_weight = {line["Item ID"] for line in lines if line.get("Weight") is None}
+    if missing_weight:
+        items = collection.database["items"].find({"Item ID": {"$in": list(missing_weight)}}, {"Item ID": 1, "Weight": 1})
+        operations = [
+            UpdateOne(
+                {"Item ID": item["Item ID"], "Weight": None, **LEGACY_WEIGHT_FILTER},
+                {"$set": {"Weight": to_number(item.get("Weight"))}}
+            )
+            for item in items
+        ]
+        if operations:
+            collection.bulk_write(operations, ordered=False)
+    collection.update_many(
+        {"_id": {"$in": [line["_id"] for line in lines]}},
+        [
+            {"$set": {"Total weight Kg": {"$multiply": [stored_number("Weight"), stored_number("Amount")]}}},
+            {"$unset": "Total wheight Kg"}
+        ]
+    )
+    return {line["user_id"] for line in lines}
+
+
+def reconcile_summaries(user_ids=None):
+    """
+    Recalcula os resumos a partir das linhas do carrinho e corrige os que divergem
+    (só dos usuários informados, se 'user_ids' for passado). Retorna a quantidade
+    de resumos corrigidos (criados, atualizados ou removidos).
+    """
+    if user_ids is None:
+        backfill_line_volumes()
+        backfill_line_weights()
+    scope = {} if user_ids is None else {"_id": {"$in": list(user_ids)}}
+    summaries = {doc["_id"]: doc for doc in get_cart_summaries_collection().find(scope)}
+    pipeline = [{"$match": {"user_id": {"$in": list(user_ids)}}}] if user_ids is not None else []
+    pipeline.append({"$group": {
+        "_id": "$user_id",
+        "total_items": {"$sum": 1},
+        "total_value": {"$sum": stored_number("Total price")},
+        "total_weight": {"$sum": stored_number("Total weight Kg")},
+        "total_volume": {"$sum": stored_number("Total volume m3")}
+    }})
+    actual = {doc["_id"]: doc for doc in get_cart_collection().aggregate(pipeline, allowDiskUse=True)}
+
+    operations = []
+    for user_id, summary in summaries.items():
+        expected = actual.get(user_id)
+        if expected is None:
+            if any(abs(summary.get(field, 0)) > RECONCILE_TOLERANCE for field in SUMMARY_FIELDS):
+                operations.append(DeleteOne({"_id": user_id, "updated_at": summary.get("updated_at")}))
+            continue
+        if any(abs(summary.get(field, 0) - expected[field]) > RECONCILE_TOLERANCE for field in SUMMARY_FIELDS):
+            # Só corrige se o resumo não mudou desde a leitura; caso contrário fica para a próxima execução
+            operations.append(UpdateOne(
+                {"_id": user_id, "updated_at": summary.get("updated_at")},
+                {"$set": {**{field: expected[field] for field in SUMMARY_FIELDS}, "updated_at": datetime.utcnow()}}
+            ))
+    for user_id, expected in actual.items():
+        if user_id not in summaries:
+            operations.append(UpdateOne(
+                {"_id": user_id},
+                {"$setOnInsert": {**{field: expected[field] for field in SUMMARY_FIELDS}, "updated_at": datetime.utcnow()}},
+                upsert=True
+            ))
+
+    if operations:
+        get_cart_summaries_collection().bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def repair_line_weights():
+    """Corrige o peso das linhas antigas e recalcula os resumos dos carrinhos afetados. Retorna os resumos corrigidos."""
+    user_ids = backfill_line_weights()
+    return reconcile_summaries(user_ids) if user_ids else 0
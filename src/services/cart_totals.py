@@ -0,0 +1,80 @@
+import math
+
+# Os totais do carrinho (/totals, resumo em cart_summaries, cache e pedido) vêm todos das
+# linhas: o preço especial do cliente é resolvido uma vez, quando o produto entra no carrinho.
+
+
+def to_number(value):
+    """Converte valores vindos da planilha (texto, None, NaN) em float; inválidos contam como 0."""
+    try:
+        number = float(value)
+    except (ValueError, TypeError):
+        return 0.0
+    return number if math.isfinite(number) else 0.0
+
+
+def calculate_volume(item):
+    """Calcula o volume em m³ baseado nas dimensões do produto (em cm)"""
+    return (to_number(item.get("Height", 0)) / 100) * (to_number(item.get("Width", 0)) / 100) * (to_number(item.get("Length", 0)) / 100)
+
+
+def stored_number(field):
+    """Expressão de agregação que lê um campo numérico gravado como texto, None ou NaN (como to_number)."""
+    return {"$convert": {"input": f"${field}", "to": "double", "onError": 0, "onNull": 0}}
+
+
+# Volume unitário (m³) de uma linha do carrinho, em expressão de agregação
+UNIT_VOLUME_EXPRESSION = {"$ifNull": ["$Volume m3", {"$divide": [
+    {"$multiply": [stored_number("Height"), stored_number("Width"), stored_number("Length")]}, 1000000
+]}]}
+
+
+def unit_volume(line):
+    """Volume unitário gravado na linha ('Volume m3') ou, em linhas antigas, calculado pelas dimensões."""
+    if "Volume m3" in line:
+        return to_number(line["Volume m3"])
+    return calculate_volume(line)
+
+
+def normalize_line_weight(line):
+    """
+    Recalcula 'Total weight Kg' (Weight × Amount) de uma linha antiga, que tem o peso total no
+    nome 'Total wheight Kg' ou não tem peso total, e remove o nome antigo. Linhas sem 'Weight'
+    ficam para backfill_line_weights, que busca o peso no produto. Retorna a linha.
+    """
+    if ("Total wheight Kg" in line or "Total weight Kg" not in line) and line.get("Weight") is not None:
+        line["Total weight Kg"] = to_number(line["Weight"]) * to_number(line.get("Amount", 1))
+        line.pop("Total wheight Kg", None)
+    return line
+
+
+def line_totals(line):
+    """(valor, peso, volume) de uma linha do carrinho, a partir dos totais gravados nela."""
+    volume = line.get("Total volume m3")
+    if volume is None:
+        volume = unit_volume(line) * to_number(line.get("Amount", 1))
+    return to_number(line.get("Total price", 0)), to_number(line.get("Total weight Kg", 0)), to_number(volume)
+
+
+def format_totals(total_items, total_value, total_weight, total_volume):
+    return {
+        "total_items": total_items,
+        "total_value": round(total_value, 2),
+        "total_weight": round(total_weight, 2),
+        "total_volume": round(total_volume, 6),  # m³ com 6 casas decimais
+        "currency": "USD"
+    }
+
+
+def totals_from_lines(lines):
+    """Totais calculados com os valores gravados nas linhas do carrinho (sem consultar os produtos)."""
+    total_value = 0.0
+    total_weight = 0.0
+    total_volume = 0.0
+    for line in lines:
+        value, weight, volume = line_totals(line)
+        total_value += value
+        total_weight += weight
+        total_volume += volume
+    return format_totals(len(lines), total_value, total_weight, total_volume)
+
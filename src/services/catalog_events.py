@@ -0,0 +1,22 @@
+# Notificação de alterações no catálogo.
+#
+# Os caches derivados da coleção 'items' registram aqui uma função de
+# invalidação, e as rotas de administração chamam notify_catalog_changed()
+# depois de cada escrita. 'item_ids' é a lista de produtos afetados, ou None
+# quando a alteração pode ter atingido o catálogo inteiro.
+
+_listeners = []
+
+
+def on_catalog_change(listener):
+    """Registra uma função listener(item_ids) chamada a cada alteração do catálogo."""
+    _listeners.append(listener)
+    return listener
+
+
+def notify_catalog_changed(item_ids=None):
+    for listener in _listeners:
+        try:
+            listener(item_ids)
+        except Exception as e:
+            print(f"Erro ao invalidar cache do catálogo ({getattr(listener, '__qualname__', listener)}): {e}")
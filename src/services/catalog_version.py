@@ -0,0 +1,66 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pymongo import ReturnDocument
+from src.models.models import get_catalog_meta_collection
+from src.services.catalog_events import on_catalog_change
+
+CATALOG_META_ID = "catalog"
+# Versão dos preços especiais por cliente, separada para não reconstruir índices do catálogo
+PRICES_META_ID = "client_prices"
+
+# Por quanto tempo (em segundos) cada worker reaproveita a versão lida do MongoDB
+DEFAULT_VERSION_TTL = 2
+
+
+class CatalogVersion:
+    """
+    Contador de versão do catálogo, incrementado a cada escrita administrativa.
+
+    A versão fica no documento 'catalog' da coleção catalog_meta, de modo que
+    todos os workers enxergam o mesmo valor. Cada worker a relê no máximo a
+    cada CATALOG_VERSION_TTL segundos, então uma validação de ETag normalmente
+    não faz nenhuma consulta ao MongoDB.
+    """
+
+    def __init__(self, ttl=None, meta_id=CATALOG_META_ID):
+        if ttl is None:
+            ttl = float(os.getenv("CATALOG_VERSION_TTL", DEFAULT_VERSION_TTL))
+        self.ttl = ttl
+        self.meta_id = meta_id
+        self._version = None
+        self._updated_at = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+
+    def _store(self, document):
+        self._version = document.get("version", 0) if document else 0
+        updated_at = document.get("updated_at") if document else None
+        self._updated_at = updated_at.replace(tzinfo=timezone.utc) if updated_at else datetime(2000, 1, 1, tzinfo=timezone.utc)
+        self._expires_at = time.monotonic() + self.ttl
+
+    def current(self):
+        """Retorna (versão, data da última alteração em UTC)."""
+        if time.monotonic() >= self._expires_at:
+            with self._lock:
+                if time.monotonic() >= self._expires_at:
+                    self._store(get_catalog_meta_collection().find_one({"_id": self.meta_id}))
+        return self._version, self._updated_at
+
+    def bump(self, item_ids=None):
+        document = get_catalog_meta_collection().find_one_and_update(
+            {"_id": self.meta_id},
+            {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow().replace(microsecond=0)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        with self._lock:
+            self._store(document)
+
+
+# Instâncias globais para serem usadas nas rotas
+catalog_version = CatalogVersion()
+on_catalog_change(catalog_version.bump)
+# Incrementada pelos ajustes de preços especiais (admin /adjust-client-prices)
+price_version = CatalogVersion(meta_id=PRICES_META_ID)
@@ -0,0 +1,81 @@
+import threading
+from collections import Counter
+from pymongo import UpdateOne, DeleteOne
+from src.models.models import get_items_collection, get_category_registry_collection
+from src.services.catalog_version import catalog_version
+
+
+def _valid_category(category):
+    return isinstance(category, str) and category.strip() != ""
+
+
+class CategoryRegistry:
+    """
+    Registro das categorias do catálogo com a quantidade de itens de cada uma.
+
+    As contagens ficam na coleção category_registry ({_id: categoria, count}) e
+    são ajustadas com $inc pelas rotas de administração. Cada worker mantém uma
+    cópia em memória que só é recarregada quando a versão do catálogo muda, o
+    que elimina o distinct() sobre 'items' a cada carregamento da página.
+    """
+
+    def __init__(self):
+        self._categories = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        documents = list(get_category_registry_collection().find({"count": {"$gt": 0}}))
+        if not documents and get_items_collection().estimated_document_count() > 0:
+            # Registro ainda não construído (primeira execução)
+            self.rebuild()
+            documents = list(get_category_registry_collection().find({"count": {"$gt": 0}}))
+        return sorted(((doc["_id"], doc["count"]) for doc in documents), key=lambda entry: entry[0])
+
+    def categories(self):
+        """Retorna [(categoria, quantidade)] ordenado por nome."""
+        version, _ = catalog_version.current()
+        if self._categories is None or self._version != version:
+            with self._lock:
+                if self._categories is None or self._version != version:
+                    self._categories = self._load()
+                    self._version = version
+        return self._categories
+
+    def adjust(self, deltas):
+        """Aplica variações {categoria: delta} às contagens."""
+        operations = [
+            UpdateOne({"_id": category}, {"$inc": {"count": delta}}, upsert=True)
+            for category, delta in deltas.items()
+            if delta and _valid_category(category)
+        ]
+        if operations:
+            get_category_registry_collection().bulk_write(operations, ordered=False)
+        self._categories = None
+
+    def rebuild(self):
+        """Reconstrói as contagens a partir da coleção items, corrigindo qualquer divergência."""
+        pipeline = [{"$group": {"_id": "$Category", "count": {"$sum": 1}}}]
+        counts = Counter({
+            doc["_id"]: doc["count"]
+            for doc in get_items_collection().aggregate(pipeline)
+            if _valid_category(doc["_id"])
+        })
+        registry = get_category_registry_collection()
+        operations = [UpdateOne({"_id": category}, {"$set": {"count": count}}, upsert=True) for category, count in counts.items()]
+        operations.extend(DeleteOne({"_id": doc["_id"]}) for doc in registry.find({}, {"_id": 1}) if doc["_id"] not in counts)
+        if operations:
+            registry.bulk_write(operations, ordered=False)
+        self._categories = None
+        return counts
+
+
+def category_deltas(before, after):
+    """Variações de contagem ao trocar as categorias 'before' pelas 'after' (listas, com repetição)."""
+    deltas = Counter(after)
+    deltas.subtract(Counter(before))
+    return deltas
+
+
+# Instância global para ser usada nas rotas
+category_registry = CategoryRegistry()
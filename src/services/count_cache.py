@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from src.services.catalog_events import on_catalog_change
+from src.services.catalog_version import catalog_version
+
+# Validade padrão (em segundos) de uma contagem em cache
+DEFAULT_COUNT_TTL = 300
+MAX_CACHED_COUNTS = 2000
+
+
+class CountCache:
+    """
+    Cache das contagens de itens por combinação de filtros do catálogo.
+
+    A chave é um hash do filtro normalizado (categoria, faixa de preço e termos
+    de busca). Sem filtro nenhum usamos estimated_document_count(), que lê só os
+    metadados da coleção; nesse caso o total é marcado como estimado.
+
+    Cada contagem guarda a versão do catálogo em que foi feita: uma escrita em
+    qualquer worker muda a versão e descarta as contagens dos demais na leitura
+    seguinte, como em category_registry.
+    """
+
+    def __init__(self, ttl=None):
+        if ttl is None:
+            ttl = float(os.getenv("CATALOG_COUNT_TTL", DEFAULT_COUNT_TTL))
+        self.ttl = ttl
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(query):
+        normalized = json.dumps(query, sort_keys=True, default=str, separators=(",", ":"))
+        return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+    def count(self, collection, query):
+        """Retorna (total, exato) para o filtro informado."""
+        if not query:
+            return collection.estimated_document_count(), False
+
+        key = self.make_key(query)
+        now = time.monotonic()
+        version, _ = catalog_version.current()
+        with self._lock:
+            cached = self._counts.get(key)
+        if cached and cached[1] > now and cached[2] == version:
+            return cached[0], True
+
+        total = collection.count_documents(query)
+        with self._lock:
+            if len(self._counts) >= MAX_CACHED_COUNTS:
+                self._counts = {k: v for k, v in self._counts.items() if v[1] > now}
+                if len(self._counts) >= MAX_CACHED_COUNTS:
+                    self._counts.clear()
+            self._counts[key] = (total, now + self.ttl, version)
+        return total, True
+
+    def invalidate(self, item_ids=None):
+        with self._lock:
+            self._counts.clear()
+
+
+# Instância global para ser usada nas rotas
+catalog_count_cache = CountCache()
+on_catalog_change(catalog_count_cache.invalidate)
@@ -0,0 +1,72 @@
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+from flask import request, make_response
+from src.services.catalog_version import catalog_version, price_version
+from src.services.stock_service import stock_snapshot
+
+
+def conditional_get(depends_on_catalog=True, extra_key=None):
+    """
+    Decorator que adiciona ETag fraco e Last-Modified à resposta de uma rota GET.
+
+    O ETag é derivado da URL, do cabeçalho Authorization (preços por cliente),
+    das versões do catálogo e dos preços especiais e de extra_key(), que retorna (chave, datetime ou
+    None) para dados de fora do MongoDB, como o snapshot de estoque. Quando o
+    navegador envia um If-None-Match válido, a rota responde 304 sem executar a
+    view, ou seja, sem consultar MongoDB ou Oracle.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            parts = [request.path, request.query_string.decode("latin-1"), request.headers.get("Authorization", "")]
+            last_modified = None
+            if depends_on_catalog:
+                version, last_modified = catalog_version.current()
+                prices, prices_modified = price_version.current()
+                parts.extend([str(version), str(prices)])
+                if prices_modified > last_modified:
+                    last_modified = prices_modified
+            if extra_key is not None:
+                key, extra_modified = extra_key()
+                parts.append(str(key))
+                if extra_modified and (last_modified is None or extra_modified > last_modified):
+                    last_modified = extra_modified
+            etag = hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()[:24]
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                since = request.if_modified_since
+                not_modified = bool(since and last_modified and last_modified.replace(microsecond=0) <= since)
+
+            if not_modified:
+                response = make_response("", 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            if last_modified:
+                response.last_modified = last_modified
+            # O navegador pode guardar a resposta, mas deve revalidar a cada uso
+            response.cache_control.no_cache = True
+            if request.headers.get("Authorization"):
+                response.cache_control.private = True
+            response.vary.add("Authorization")
+            return response
+        return wrapper
+    return decorator
+
+
+def stock_snapshot_key():
+    """
+    extra_key para rotas que incluem a disponibilidade do snapshot de estoque.
+    Usa o hash do conteúdo, igual em todos os workers com os mesmos dados (o
+    momento da carga difere de um worker para outro e impediria o 304).
+    """
+    digest = stock_snapshot.digest
+    if digest is None:
+        return "stock-empty", None
+    return f"stock-{digest}", datetime.fromtimestamp(int(stock_snapshot.changed_at), tz=timezone.utc)
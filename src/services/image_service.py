@@ -0,0 +1,120 @@
+import os
+import posixpath
+import tempfile
+from src.models.models import get_fotos_collection
+
+# Pillow é opcional: sem ele as rotas de imagem servem o arquivo original
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", os.path.join(os.path.dirname(STATIC_FOLDER), 'image_cache'))
+
+# Maior lado (em pixels) de cada tamanho derivado
+IMAGE_SIZES = {'list': 240, 'detail': 640, 'zoom': 1280}
+SOURCE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.webp', '.gif'}
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+
+
+def local_image_path(photo_url):
+    """
+    Caminho relativo à pasta static para URLs de fotos servidas pela própria aplicação
+    (ex.: 'Items_Images/6916(5).png'). Retorna None para URLs externas ou inválidas.
+    """
+    if not isinstance(photo_url, str) or not photo_url or '://' in photo_url or photo_url.startswith('//'):
+        return None
+    relative = posixpath.normpath(photo_url.split('?', 1)[0].lstrip('/'))
+    if relative.startswith('..') or os.path.splitext(relative)[1].lower() not in SOURCE_EXTENSIONS:
+        return None
+    return relative
+
+
+def image_url(photo_url, size):
+    """URL da versão redimensionada de uma foto local; URLs externas são devolvidas sem alteração."""
+    relative = local_image_path(photo_url)
+    if relative is None or size not in IMAGE_SIZES:
+        return photo_url
+    return f"/img/{size}/{relative}"
+
+
+def derivative_format(relative, accept_webp):
+    """Formato da imagem derivada: WebP quando o navegador aceita, senão o formato de origem."""
+    if accept_webp:
+        return 'webp'
+    extension = os.path.splitext(relative)[1].lower()
+    return 'jpeg' if extension in ('.jpg', '.jpeg') else 'png'
+
+
+def derivative_path(relative, size, fmt):
+    # Mantém a extensão de origem no nome ('foto.png.webp'), para que 'foto.png' e 'foto.jpg' não colidam
+    return os.path.join(IMAGE_CACHE_DIR, size, f"{relative}.{'jpg' if fmt == 'jpeg' else fmt}")
+
+
+def get_derivative(relative, size, fmt):
+    """
+    Retorna o caminho da imagem derivada no cache em disco, gerando-a se necessário.
+    Retorna None se o original não existir ou se o Pillow não estiver instalado.
+    """
+    source = os.path.join(STATIC_FOLDER, relative)
+    if Image is None or size not in IMAGE_SIZES or not os.path.isfile(source):
+        return None
+
+    target = derivative_path(relative, size, fmt)
+    try:
+        if os.path.getmtime(target) >= os.path.getmtime(source):
+            return target
+    except OSError:
+        pass
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with Image.open(source) as image:
+        image.thumbnail((IMAGE_SIZES[size], IMAGE_SIZES[size]))
+        if fmt == 'jpeg':
+            image = image.convert('RGB')
+            options = {'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True}
+        elif fmt == 'webp':
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA')
+            options = {'quality': WEBP_QUALITY, 'method': 4}
+        else:
+            options = {'optimize': True}
+        # Grava em um arquivo temporário exclusivo e renomeia, para que outra requisição (ou worker)
+        # nunca leia um arquivo pela metade nem grave no mesmo temporário
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(target), suffix='.tmp', delete=False) as temporary:
+            try:
+                image.save(temporary, format=fmt.upper(), **options)
+            except Exception:
+                temporary.close()
+                os.unlink(temporary.name)
+                raise
+    os.replace(temporary.name, target)
+    return target
+
+
+def pregenerate_derivatives(sizes=None, formats=('webp', None)):
+    """
+    Gera antecipadamente as derivadas de todas as fotos locais cadastradas.
+    Em 'formats', None significa o formato de origem. Retorna (geradas, ignoradas).
+    """
+    sizes = sizes or list(IMAGE_SIZES)
+    generated = skipped = 0
+    for photo_url in get_fotos_collection().distinct('Photo URL'):
+        relative = local_image_path(photo_url)
+        if relative is None:
+            skipped += 1
+            continue
+        for size in sizes:
+            for fmt in formats:
+                fmt = fmt or derivative_format(relative, accept_webp=False)
+                try:
+                    if get_derivative(relative, size, fmt):
+                        generated += 1
+                    else:
+                        skipped += 1
+                except OSError as e:
+                    print(f"Erro ao gerar {size}/{fmt} de {relative}: {e}")
+                    skipped += 1
+    return generated, skipped
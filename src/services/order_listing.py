@@ -0,0 +1,40 @@
+from src.models.models import get_pedidos_collection
+from src.services.pagination import find_page
+
+# Campos da listagem de pedidos: número, data, totais e status. Os itens só vêm no detalhe.
+ORDER_SUMMARY_PROJECTION = {
+    "Order": 1,
+    "Data": 1,
+    "Client": 1,
+    "Total Itens": 1,
+    "Total price": 1,
+    "Total weight Kg": 1,
+    "Total wheight Kg": 1,  # nome usado pelos pedidos importados da planilha
+    "Total volume m3": 1,
+    "sankhya_integration.status": 1,
+    "sankhya_integration.nunota": 1,
+}
+# Mais recentes primeiro; _id desempata pedidos com a mesma data
+ORDER_LIST_SORT = [("Data", -1), ("_id", -1)]
+DEFAULT_ORDERS_PER_PAGE = 50
+MAX_ORDERS_PER_PAGE = 200
+
+
+def parse_per_page(value):
+    """Tamanho de página vindo da query string, limitado a MAX_ORDERS_PER_PAGE."""
+    try:
+        per_page = int(value) if value is not None else DEFAULT_ORDERS_PER_PAGE
+    except (ValueError, TypeError):
+        per_page = DEFAULT_ORDERS_PER_PAGE
+    return max(1, min(per_page, MAX_ORDERS_PER_PAGE))
+
+
+def list_order_summaries(query, cursor=None, per_page=DEFAULT_ORDERS_PER_PAGE):
+    """
+    Página de resumos de pedidos por keyset. Retorna (pedidos, próximo cursor).
+    O custo de cada página não depende do tamanho do histórico.
+    """
+    return find_page(
+        get_pedidos_collection(), query, ORDER_LIST_SORT, per_page,
+        cursor=cursor, projection=ORDER_SUMMARY_PROJECTION
+    )
@@ -0,0 +1,77 @@
+import base64
+import json
+from bson import ObjectId
+
+
+class InvalidCursorError(ValueError):
+    """Cursor de paginação malformado ou incompatível com a ordenação."""
+
+
+def _encode_value(value):
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and "$oid" in value:
+        return ObjectId(value["$oid"])
+    return value
+
+
+def encode_cursor(values):
+    """Serializa os valores da chave de ordenação em um token opaco (base64 url-safe)."""
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, sort_fields):
+    """Recupera os valores da chave de ordenação a partir do token gerado por encode_cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        values = [_decode_value(v) for v in values]
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError(f"Cursor inválido: {e}")
+    if len(values) != len(sort_fields):
+        raise InvalidCursorError("Cursor inválido para esta ordenação")
+    return values
+
+
+def cursor_for(document, sort_fields):
+    """Gera o cursor que aponta para logo depois do documento informado."""
+    return encode_cursor([document.get(field) for field, _ in sort_fields])
+
+
+def keyset_filter(sort_fields, values):
+    """
+    Filtro que seleciona os documentos posteriores à chave 'values' na ordenação
+    'sort_fields' ([(campo, 1 ou -1), ...]). O último campo deve ser único.
+    """
+    clauses = []
+    for i, (field, direction) in enumerate(sort_fields):
+        clause = {prev_field: values[j] for j, (prev_field, _) in enumerate(sort_fields[:i])}
+        clause[field] = {"$gt" if direction == 1 else "$lt": values[i]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+
+def find_page(collection, query, sort_fields, limit, cursor=None, projection=None):
+    """
+    Busca uma página por keyset a partir do cursor. Retorna (documentos, próximo cursor);
+    o próximo cursor é None quando não há mais documentos.
+    """
+    if cursor:
+        values = decode_cursor(cursor, sort_fields)
+        query = {"$and": [query, keyset_filter(sort_fields, values)]} if query else keyset_filter(sort_fields, values)
+
+    documents = list(collection.find(query, projection).sort(sort_fields).limit(limit + 1))
+    return split_page(documents, sort_fields, limit)
+
+
+def split_page(documents, sort_fields, limit):
+    """Recebe até limit + 1 documentos e separa a página do indicador de próxima página."""
+    if len(documents) > limit:
+        documents = documents[:limit]
+        return documents, cursor_for(documents[-1], sort_fields)
+    return documents, None
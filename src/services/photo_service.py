@@ -0,0 +1,68 @@
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+from src.models.models import client, get_items_collection, get_fotos_collection
+
+# Código do MongoDB para "IllegalOperation" (transações fora de replica set)
+ILLEGAL_OPERATION = 20
+BACKFILL_BATCH_SIZE = 500
+
+
+def run_in_transaction(callback):
+    """
+    Executa callback(session) dentro de uma transação.
+    Em um servidor standalone (sem suporte a transações) executa sem sessão.
+    """
+    with client.start_session() as session:
+        try:
+            return session.with_transaction(callback)
+        except OperationFailure as e:
+            if e.code != ILLEGAL_OPERATION:
+                raise
+    return callback(None)
+
+
+def refresh_photo_summaries(item_ids, session=None):
+    """
+    Recalcula 'main_photo_url' e 'photo_count' dos itens informados a partir da coleção fotos.
+    A foto principal é a marcada com 'Is Primary'; sem ela, a primeira cadastrada.
+    """
+    item_ids = list(dict.fromkeys(item_ids))
+    if not item_ids:
+        return 0
+
+    pipeline = [
+        {"$match": {"Item ID": {"$in": item_ids}}},
+        {"$sort": {"Is Primary": -1, "_id": 1}},
+        {"$group": {
+            "_id": "$Item ID",
+            "main_photo_url": {"$first": "$Photo URL"},
+            "photo_count": {"$sum": 1}
+        }}
+    ]
+    summaries = {doc["_id"]: doc for doc in get_fotos_collection().aggregate(pipeline, session=session)}
+
+    operations = []
+    for item_id in item_ids:
+        summary = summaries.get(item_id)
+        if summary and summary.get("main_photo_url"):
+            update = {"$set": {"main_photo_url": summary["main_photo_url"], "photo_count": summary["photo_count"]}}
+        else:
+            update = {"$set": {"photo_count": summary["photo_count"] if summary else 0}, "$unset": {"main_photo_url": ""}}
+        operations.append(UpdateOne({"Item ID": item_id}, update))
+
+    get_items_collection().bulk_write(operations, ordered=False, session=session)
+    return len(operations)
+
+
+def backfill_photo_summaries():
+    """Preenche 'main_photo_url' e 'photo_count' em todos os itens. Retorna o total processado."""
+    processed = 0
+    batch = []
+    for item in get_items_collection().find({"Item ID": {"$exists": True}}, {"Item ID": 1, "_id": 0}):
+        batch.append(item["Item ID"])
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            processed += refresh_photo_summaries(batch)
+            batch = []
+    if batch:
+        processed += refresh_photo_summaries(batch)
+    return processed
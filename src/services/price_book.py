@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from src.models.models import get_client_prices_collection
+from src.services.catalog_version import price_version
+
+DEFAULT_MAX_CLIENTS = 200
+DEFAULT_PRICE_BOOK_TTL = 300
+
+
+class ClientPriceBook:
+    """
+    Tabela de preços especiais por cliente mantida em memória.
+
+    A tabela de um cliente é carregada de 'client_prices' no primeiro uso e
+    aplicada aos itens depois da consulta ao MongoDB, em vez de um $lookup por
+    item. Os clientes menos usados são descartados (LRU) e cada tabela expira
+    após PRICE_BOOK_TTL segundos. Uma tabela carregada antes da versão atual dos
+    preços (price_version, incrementada pelos ajustes) é recarregada, para que o
+    ETag das rotas do catálogo nunca corresponda a preços antigos em outro worker.
+    """
+
+    def __init__(self, max_clients=None, ttl=None):
+        if max_clients is None:
+            max_clients = int(os.getenv("PRICE_BOOK_MAX_CLIENTS", DEFAULT_MAX_CLIENTS))
+        if ttl is None:
+            ttl = float(os.getenv("PRICE_BOOK_TTL", DEFAULT_PRICE_BOOK_TTL))
+        self.max_clients = max_clients
+        self.ttl = ttl
+        self._books = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self, client_id):
+        cursor = get_client_prices_collection().find(
+            {"client_id": client_id},
+            {"_id": 0, "item_id": 1, "special_price": 1}
+        )
+        return {doc["item_id"]: doc["special_price"] for doc in cursor if doc.get("special_price") is not None}
+
+    def get_prices(self, client_id):
+        """Retorna {item_id: preço especial} do cliente (vazio se não houver)."""
+        now = time.monotonic()
+        version, _ = price_version.current()
+        with self._lock:
+            entry = self._books.get(client_id)
+            if entry and entry[1] > now and entry[2] == version:
+                self._books.move_to_end(client_id)
+                return entry[0]
+
+        prices = self._load(client_id)
+        with self._lock:
+            self._books[client_id] = (prices, now + self.ttl, version)
+            self._books.move_to_end(client_id)
+            while len(self._books) > self.max_clients:
+                self._books.popitem(last=False)
+        return prices
+
+    def resolve(self, client_id, item_id, base_price):
+        """Retorna (preço, tem_preço_especial) de um item para o cliente."""
+        if not client_id:
+            return base_price, False
+        special = self.get_prices(client_id).get(item_id)
+        if special is None:
+            return base_price, False
+        return special, True
+
+    def apply(self, client_id, items):
+        """Aplica os preços do cliente aos itens, preservando o preço de tabela em 'original_price'."""
+        prices = self.get_prices(client_id) if client_id else None
+        for item in items:
+            item["original_price"] = item.get("Sale Price")
+            if prices is None:
+                continue
+            special = prices.get(item.get("Item ID"))
+            item["has_special_price"] = special is not None
+            if special is not None:
+                item["Sale Price"] = special
+        return items
+
+    def invalidate(self, client_id=None):
+        with self._lock:
+            if client_id is None:
+                self._books.clear()
+            else:
+                self._books.pop(client_id, None)
+
+
+# Instância global para ser usada nas rotas
+client_price_book = ClientPriceBook()
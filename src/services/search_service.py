@@ -0,0 +1,58 @@
+from src.services.suggest_index import suggest_index
+
+# A busca usa o índice de texto 'items_text_search', declarado em src/models/indexes.py.
+# O MongoDB o mantém atualizado a cada escrita em 'items' (inclusive as rotas de administração).
+#
+# Cada termo vai ao $text como frase entre aspas, o que exige todos os termos no
+# produto (como a antiga busca por regex), em vez de qualquer um deles. O índice de
+# texto só encontra palavras inteiras: quando a consulta não retorna nenhum produto, a
+# rota repete a listagem com prefixos de palavra no Name ("parafu" encontra "Parafuso"),
+# resolvidos pelo índice em memória do autocompletar e filtrados pelo índice de 'Item ID'.
+
+# Estágios de agregação que expõem e ordenam pela relevância da busca textual
+SEARCH_SCORE_STAGE = {"$addFields": {"relevance": {"$meta": "textScore"}}}
+SEARCH_SORT_FIELDS = [("relevance", -1), ("Item ID", 1)]
+# A busca por prefixo não tem relevância: ordena só por ID
+PREFIX_SORT_FIELDS = [("Item ID", 1)]
+
+
+def _with_item_id(search, query):
+    # Termos numéricos também casam com o 'Item ID' exato
+    try:
+        item_id = int(search)
+    except ValueError:
+        return query
+    return {"$or": [{"Item ID": item_id}, query]}
+
+
+def search_terms(search):
+    """Termos da busca (aspas digitadas pelo usuário são ignoradas)."""
+    return search.replace('"', " ").split()
+
+
+def text_search_query(search):
+    """Filtro $text que exige todos os termos (cada um como frase entre aspas)."""
+    phrases = " ".join(f'"{term}"' for term in search_terms(search))
+    return _with_item_id(search, {"$text": {"$search": phrases}})
+
+
+def prefix_search_query(search):
+    """
+    Filtro dos produtos em que cada termo inicia uma palavra do Name (ignorando acentos e
+    maiúsculas) ou o Item ID. Os IDs vêm do índice do autocompletar; o filtro usa o índice de 'Item ID'.
+    """
+    return {"Item ID": {"$in": suggest_index.matching_item_ids(search)}}
+
+
+def search_plans(search, filters=None):
+    """
+    Consultas da busca, em ordem de preferência, como (filtro, estágios extras, campos de
+    ordenação): a textual, com relevância, e a por prefixo. A rota usa a primeira que
+    retornar produtos; a por prefixo só é montada se for pedida.
+    """
+    filters = dict(filters or {})
+    if not search_terms(search):
+        yield filters, [], PREFIX_SORT_FIELDS
+        return
+    yield {**filters, **text_search_query(search)}, [SEARCH_SCORE_STAGE], SEARCH_SORT_FIELDS
+    yield {**filters, **prefix_search_query(search)}, [], PREFIX_SORT_FIELDS
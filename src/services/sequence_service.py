@@ -0,0 +1,78 @@
+import os
+import threading
+from pymongo import ReturnDocument
+from src.models.models import get_counters_collection, get_pedidos_collection, get_items_collection, get_fotos_collection
+
+
+class Sequence:
+    """
+    Gerador de números sequenciais (nº do pedido, Item ID, Photo ID) baseado na coleção counters.
+
+    Cada sequência é um documento {_id: nome, value: último número entregue}, avançado
+    com $inc atômico, o que elimina a busca pelo maior valor existente e a corrida entre
+    requisições simultâneas. Na primeira utilização o contador é inicializado com o maior
+    valor já gravado na coleção de origem.
+
+    Com block_size > 1 cada worker reserva um bloco de números de uma vez e os entrega a
+    partir da memória; em troca, os números deixam de ser contíguos entre workers e os
+    não utilizados de um bloco se perdem quando o processo termina.
+    """
+
+    def __init__(self, name, get_source_collection, field, block_size=1):
+        self.name = name
+        self.get_source_collection = get_source_collection
+        self.field = field
+        self.block_size = max(1, block_size)
+        self._lock = threading.Lock()
+        self._seeded = False
+        self._next = 0
+        self._end = 0
+        self._pid = None
+
+    def _seed(self):
+        """Garante que o contador não fique atrás do maior valor existente (idempotente)."""
+        if self._seeded:
+            return
+        last = list(
+            self.get_source_collection()
+            .find({self.field: {"$type": "number"}}, {self.field: 1, "_id": 0})
+            .sort(self.field, -1)
+            .limit(1)
+        )
+        self.advance_to(last[0][self.field] if last else 0)
+        self._seeded = True
+
+    def advance_to(self, value):
+        """Avança o contador até 'value' se ele estiver atrás (ex.: IDs vindos de uma importação)."""
+        get_counters_collection().update_one({"_id": self.name}, {"$max": {"value": int(value)}}, upsert=True)
+
+    def reserve(self, count=1):
+        """Reserva 'count' números contíguos diretamente no contador. Retorna o primeiro."""
+        self._seed()
+        counter = get_counters_collection().find_one_and_update(
+            {"_id": self.name},
+            {"$inc": {"value": count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return counter["value"] - count + 1
+
+    def next(self):
+        """Próximo número da sequência."""
+        if self.block_size == 1:
+            return self.reserve(1)
+        with self._lock:
+            # Um bloco herdado do processo mestre (fork) seria entregue em dobro pelos workers
+            if self._pid != os.getpid() or self._next >= self._end:
+                self._next = self.reserve(self.block_size)
+                self._end = self._next + self.block_size
+                self._pid = os.getpid()
+            value = self._next
+            self._next += 1
+            return value
+
+
+# Instâncias globais para serem usadas nas rotas
+order_number_sequence = Sequence("order_number", get_pedidos_collection, "Order", block_size=int(os.getenv("ORDER_NUMBER_BLOCK_SIZE", 1)))
+item_id_sequence = Sequence("item_id", get_items_collection, "Item ID")
+photo_id_sequence = Sequence("photo_id", get_fotos_collection, "Photo ID")
@@ -0,0 +1,169 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from flask import Response, request
+
+# Brotli é opcional: sem ele servimos apenas as variantes gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Arquivos que recebem o hash do conteúdo no nome (ex.: app.js -> app.1a2b3c4d5e6f.js)
+FINGERPRINT_EXTENSIONS = {'.js', '.css'}
+PAGE_EXTENSIONS = {'.html'}
+# Abaixo disso a compressão não compensa o cabeçalho extra
+MIN_COMPRESS_SIZE = 1024
+HASH_LENGTH = 12
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# As páginas HTML são revalidadas a cada navegação (ETag), pois apontam para os nomes com hash
+PAGE_CACHE_CONTROL = "no-cache"
+
+# src="app.js", href="./styles.css" ou src="/app.js" nas páginas estáticas
+ASSET_REFERENCE = re.compile(r"""(\b(?:src|href)=["'])(?:\./|/)?([^"'/?#:]+)(["'])""")
+
+
+class StaticAsset:
+    """Conteúdo de um arquivo estático já lido e comprimido em memória."""
+
+    def __init__(self, name, content):
+        self.name = name
+        self.mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        self.digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+        # Codificação -> corpo; None é o conteúdo sem compressão
+        self.variants = {None: content}
+        if len(content) >= MIN_COMPRESS_SIZE:
+            compressed = gzip.compress(content, compresslevel=9, mtime=0)
+            if len(compressed) < len(content):
+                self.variants['gzip'] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(content, quality=11)
+                if len(compressed) < len(content):
+                    self.variants['br'] = compressed
+
+
+class StaticAssets:
+    """
+    Camada de arquivos estáticos do front-end.
+
+    Na primeira utilização lê a pasta static, gera nomes com o hash do conteúdo para
+    os .js/.css, reescreve as páginas HTML para apontarem para esses nomes e guarda
+    versões gzip (e brotli, se disponível) de tudo. Os arquivos com hash são servidos
+    como imutáveis; as páginas, com revalidação por ETag.
+    """
+
+    def __init__(self, folder, auto_reload=False):
+        self.folder = folder
+        # Em desenvolvimento, recarrega quando algum arquivo da pasta muda
+        self.auto_reload = auto_reload
+        self._lock = threading.Lock()
+        self._signature = None
+        self._assets = {}
+        self._hashed_names = {}
+        self._pages = {}
+
+    def _scan(self):
+        """(nome, mtime, tamanho) dos arquivos da raiz da pasta static."""
+        entries = []
+        with os.scandir(self.folder) as iterator:
+            for entry in iterator:
+                if entry.is_file():
+                    stat = entry.stat()
+                    entries.append((entry.name, stat.st_mtime_ns, stat.st_size))
+        return tuple(sorted(entries))
+
+    def _read(self, name):
+        with open(os.path.join(self.folder, name), 'rb') as f:
+            return f.read()
+
+    def build(self):
+        """Lê, gera os nomes com hash e comprime os arquivos da pasta static."""
+        with self._lock:
+            signature = self._scan()
+            assets, hashed_names, pages = {}, {}, {}
+            for name, _, _ in signature:
+                base, extension = os.path.splitext(name)
+                if extension in FINGERPRINT_EXTENSIONS:
+                    asset = StaticAsset(name, self._read(name))
+                    hashed = f"{base}.{asset.digest}{extension}"
+                    assets[hashed] = asset
+                    hashed_names[name] = hashed
+
+            def rewrite(match):
+                hashed = hashed_names.get(match.group(2))
+                if hashed is None:
+                    return match.group(0)
+                return f"{match.group(1)}/{hashed}{match.group(3)}"
+
+            for name, _, _ in signature:
+                if os.path.splitext(name)[1] in PAGE_EXTENSIONS:
+                    html = self._read(name).decode('utf-8')
+                    pages[name] = StaticAsset(name, ASSET_REFERENCE.sub(rewrite, html).encode('utf-8'))
+
+            self._assets, self._hashed_names, self._pages = assets, hashed_names, pages
+            self._signature = signature
+        return len(assets), len(pages)
+
+    def _ensure_built(self):
+        if self._signature is None or (self.auto_reload and self._scan() != self._signature):
+            self.build()
+
+    def asset(self, hashed_name):
+        """Arquivo com hash (ex.: 'app.1a2b3c4d5e6f.js') ou None."""
+        self._ensure_built()
+        return self._assets.get(hashed_name)
+
+    def page(self, name):
+        """Página HTML já reescrita (ex.: 'index.html') ou None."""
+        self._ensure_built()
+        return self._pages.get(name)
+
+    def url_for(self, name):
+        """URL com hash de um arquivo estático; arquivos sem hash mantêm o nome original."""
+        self._ensure_built()
+        return f"/{self._hashed_names.get(name, name)}"
+
+    def manifest(self):
+        """{nome original: nome com hash}"""
+        self._ensure_built()
+        return dict(self._hashed_names)
+
+    def _respond(self, asset, cache_control):
+        encoding = None
+        for candidate in ('br', 'gzip'):
+            if candidate in asset.variants and request.accept_encodings[candidate]:
+                encoding = candidate
+                break
+
+        response = Response(asset.variants[encoding], mimetype=asset.mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = cache_control
+        # A ETag distingue a codificação, pois os bytes enviados são diferentes
+        response.set_etag(f"{asset.digest}-{encoding or 'identity'}")
+        return response.make_conditional(request)
+
+    def asset_response(self, hashed_name):
+        """Resposta imutável para um arquivo com hash, ou None se o nome não existir."""
+        asset = self.asset(hashed_name)
+        if asset is None:
+            return None
+        return self._respond(asset, IMMUTABLE_CACHE_CONTROL)
+
+    def page_response(self, name):
+        """Resposta para uma página HTML reescrita, ou None se ela não existir."""
+        page = self.page(name)
+        if page is None:
+            return None
+        return self._respond(page, PAGE_CACHE_CONTROL)
+
+
+static_assets = StaticAssets(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static'),
+    auto_reload=os.getenv("STATIC_ASSETS_RELOAD", "1" if os.getenv("FLASK_ENV") == "development" else "0") == "1",
+)
@@ -0,0 +1,214 @@
+import hashlib
+import os
+import threading
+import time
+from sqlalchemy import text, bindparam
+from src.models.models import oracle_connection
+
+# Local de estoque usado pelo portal (armazém principal)
+STOCK_CODLOCAL = 401
+
+# Intervalo padrão (em segundos) entre atualizações do snapshot de estoque
+DEFAULT_REFRESH_INTERVAL = 60
+
+# Validade padrão (em segundos) das consultas pontuais de estoque
+DEFAULT_LOOKUP_TTL = 15
+
+# O Oracle aceita no máximo 1000 expressões em uma lista IN
+LOOKUP_CHUNK_SIZE = 500
+
+
+class StockSnapshotService:
+    """
+    Mantém em memória o mapa de disponibilidade (CODPROD -> DISPONIVEL) do TGFEST.
+
+    O snapshot é atualizado periodicamente por uma thread em segundo plano, e as
+    leituras sempre retornam o último mapa carregado (stale-while-revalidate),
+    de modo que as páginas do catálogo nunca esperam pelo Oracle.
+    """
+
+    def __init__(self, refresh_interval=None):
+        if refresh_interval is None:
+            refresh_interval = int(os.getenv("STOCK_REFRESH_INTERVAL", DEFAULT_REFRESH_INTERVAL))
+        self.refresh_interval = refresh_interval
+        self._stock_map = {}
+        self._loaded_at = None
+        self._digest = None
+        self._changed_at = None
+        self._last_refresh_duration = None
+        self._last_error = None
+        self._refresh_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def refresh(self):
+        """Recarrega o snapshot a partir do Oracle. Retorna True em caso de sucesso."""
+        # Evita duas atualizações simultâneas; quem chegar depois apenas desiste
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            started = time.monotonic()
+            new_map = {}
+            try:
+                with oracle_connection() as connection:
+                    sql_query = text("""
+                        SELECT CODPROD, GREATEST(ESTOQUE - RESERVADO, 0) AS DISPONIVEL
+                        FROM TGFEST
+                        WHERE CODLOCAL = :codlocal
+                    """)
+                    result = connection.execute(sql_query, {"codlocal": STOCK_CODLOCAL})
+                    for row in result:
+                        new_map[row[0]] = row[1]
+            except Exception as e:
+                self._last_error = str(e)
+                print(f"Erro ao atualizar o snapshot de estoque do Oracle: {e}")
+                return False
+
+            # Derivado só do conteúdo: workers com os mesmos dados geram o mesmo ETag
+            digest = hashlib.sha1(repr(sorted(new_map.items())).encode("utf-8")).hexdigest()[:16]
+            if digest != self._digest:
+                self._changed_at = time.time()
+            # Troca atômica da referência: leitores nunca veem um mapa pela metade
+            self._stock_map = new_map
+            self._digest = digest
+            self._loaded_at = time.time()
+            self._last_refresh_duration = time.monotonic() - started
+            self._last_error = None
+            return True
+        finally:
+            self._refresh_lock.release()
+
+    def _run(self):
+        while True:
+            self.refresh()
+            self._wakeup.wait(self.refresh_interval)
+            self._wakeup.clear()
+
+    def _ensure_worker(self):
+        # A thread é iniciada sob demanda e recriada após um fork (workers do gunicorn)
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="stock-snapshot", daemon=True)
+            self._thread.start()
+
+    def request_refresh(self):
+        """Antecipa a próxima atualização em segundo plano sem bloquear o chamador."""
+        self._ensure_worker()
+        self._wakeup.set()
+
+    def get_map(self):
+        """Retorna o último mapa de disponibilidade carregado (pode estar vazio no primeiro acesso)."""
+        self._ensure_worker()
+        return self._stock_map
+
+    def get_available(self, item_id):
+        return self.get_map().get(item_id, 0)
+
+    @property
+    def loaded_at(self):
+        return self._loaded_at
+
+    @property
+    def digest(self):
+        """Hash do conteúdo do snapshot (None antes da primeira carga)."""
+        return self._digest
+
+    @property
+    def changed_at(self):
+        """Momento (epoch) em que este worker carregou um conteúdo diferente do anterior."""
+        return self._changed_at
+
+    def status(self):
+        """Informações de frescor do snapshot para monitoramento."""
+        age = time.time() - self._loaded_at if self._loaded_at else None
+        return {
+            "loaded": self._loaded_at is not None,
+            "snapshot_age_seconds": round(age, 3) if age is not None else None,
+            "last_refresh_duration_seconds": round(self._last_refresh_duration, 3) if self._last_refresh_duration is not None else None,
+            "refresh_interval_seconds": self.refresh_interval,
+            "items": len(self._stock_map),
+            "last_error": self._last_error
+        }
+
+
+class StockLookupService:
+    """
+    Consulta a disponibilidade de um conjunto arbitrário de produtos no TGFEST.
+
+    Usada pelo carrinho, pelo fechamento de pedido e pelo detalhe do produto, onde
+    precisamos de poucos itens com dados recentes. Os valores ficam em um cache
+    por item com validade curta, e os itens ausentes do cache são buscados em
+    uma única ida ao Oracle (dividida em blocos de LOOKUP_CHUNK_SIZE).
+    """
+
+    def __init__(self, ttl=None):
+        if ttl is None:
+            ttl = float(os.getenv("STOCK_LOOKUP_TTL", DEFAULT_LOOKUP_TTL))
+        self.ttl = ttl
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _fetch(self, codprods):
+        found = {}
+        sql_query = text("""
+            SELECT CODPROD, GREATEST(ESTOQUE - RESERVADO, 0) AS DISPONIVEL
+            FROM TGFEST
+            WHERE CODLOCAL = :codlocal AND CODPROD IN :codprods
+        """).bindparams(bindparam("codprods", expanding=True))
+        with oracle_connection() as connection:
+            for start in range(0, len(codprods), LOOKUP_CHUNK_SIZE):
+                chunk = codprods[start:start + LOOKUP_CHUNK_SIZE]
+                result = connection.execute(sql_query, {"codlocal": STOCK_CODLOCAL, "codprods": chunk})
+                for row in result:
+                    found[row[0]] = row[1]
+        return found
+
+    def get_many(self, item_ids):
+        """Retorna {item_id: disponível} para os IDs informados."""
+        now = time.monotonic()
+        stock = {}
+        missing = []
+        with self._lock:
+            for item_id in dict.fromkeys(item_ids):
+                cached = self._cache.get(item_id)
+                if cached and cached[1] > now:
+                    stock[item_id] = cached[0]
+                else:
+                    missing.append(item_id)
+
+        if missing:
+            try:
+                found = self._fetch(missing)
+            except Exception as e:
+                # Sem Oracle, recorre ao último snapshot em vez de falhar a requisição
+                print(f"Erro ao consultar estoque no Oracle: {e}")
+                snapshot = stock_snapshot.get_map()
+                for item_id in missing:
+                    stock[item_id] = snapshot.get(item_id, 0)
+                return stock
+
+            expires_at = time.monotonic() + self.ttl
+            with self._lock:
+                for item_id in missing:
+                    # Produtos sem registro no TGFEST também são cacheados como indisponíveis
+                    value = found.get(item_id, 0)
+                    self._cache[item_id] = (value, expires_at)
+                    stock[item_id] = value
+                # Descarta entradas vencidas para o cache não crescer indefinidamente
+                if len(self._cache) > 10000:
+                    self._cache = {k: v for k, v in self._cache.items() if v[1] > now}
+        return stock
+
+    def get(self, item_id):
+        return self.get_many([item_id]).get(item_id, 0)
+
+
+# Instâncias globais para serem usadas nas rotas
+stock_snapshot = StockSnapshotService()
+stock_lookup = StockLookupService()
@@ -0,0 +1,304 @@
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from src.models.models import get_items_collection
+from src.services.catalog_events import on_catalog_change
+from src.services.catalog_version import catalog_version
+from src.services.image_service import image_url
+
+# Intervalo padrão (em segundos) entre verificações da versão do catálogo
+DEFAULT_POLL_INTERVAL = 5
+DEFAULT_SUGGESTIONS = 8
+MAX_SUGGESTIONS = 20
+
+SUGGEST_PROJECTION = {"_id": 0, "Item ID": 1, "Name": 1, "Category": 1, "main_photo_url": 1}
+TOKEN_SEPARATOR = re.compile(r"[^0-9a-z]+")
+
+
+def tokenize(text):
+    """Quebra o texto em termos minúsculos e sem acentos ("Café Orgânico" -> ['cafe', 'organico'])."""
+    if not isinstance(text, str):
+        return []
+    normalized = unicodedata.normalize("NFKD", text.lower())
+    normalized = "".join(char for char in normalized if not unicodedata.combining(char))
+    return [token for token in TOKEN_SEPARATOR.split(normalized) if token]
+
+
+class _TrieNode:
+    __slots__ = ("children", "keys", "top")
+
+    def __init__(self):
+        self.children = {}
+        # Chaves de todas as sugestões cujos termos passam por este prefixo
+        self.keys = set()
+        # As MAX_SUGGESTIONS melhores chaves, calculadas na primeira consulta após uma alteração
+        self.top = None
+
+
+class _Trie:
+    """Árvore de prefixos: termo -> chaves das sugestões que contêm um termo com esse prefixo."""
+
+    def __init__(self):
+        self.root = _TrieNode()
+
+    def insert(self, key, tokens):
+        for token in tokens:
+            node = self.root
+            for char in token:
+                node = node.children.setdefault(char, _TrieNode())
+                node.keys.add(key)
+                node.top = None
+
+    def remove(self, key, tokens):
+        for token in tokens:
+            path = []
+            node = self.root
+            for char in token:
+                child = node.children.get(char)
+                if child is None:
+                    break
+                path.append((node, char, child))
+                node = child
+            for parent, char, child in reversed(path):
+                child.keys.discard(key)
+                child.top = None
+                if not child.keys:
+                    del parent.children[char]
+
+    def find(self, prefix):
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+
+class _Snapshot:
+    """Estado completo do índice; uma reconstrução monta um novo e troca a referência."""
+
+    def __init__(self):
+        self.trie = _Trie()
+        # chave -> sugestão; a chave é ('category', nome) ou ('item', Item ID)
+        self.entries = {}
+        self.tokens = {}
+        self.category_counts = Counter()
+        self.item_categories = {}
+
+    def _put(self, key, entry, tokens):
+        if key in self.tokens:
+            self.trie.remove(key, self.tokens[key])
+        self.entries[key] = entry
+        self.tokens[key] = tokens
+        self.trie.insert(key, tokens)
+
+    def _drop(self, key):
+        tokens = self.tokens.pop(key, None)
+        if tokens is not None:
+            self.trie.remove(key, tokens)
+        self.entries.pop(key, None)
+
+    def _count_category(self, category, delta):
+        if not isinstance(category, str) or not category.strip():
+            return
+        self.category_counts[category] += delta
+        key = ("category", category)
+        if self.category_counts[category] <= 0:
+            del self.category_counts[category]
+            self._drop(key)
+        elif key in self.entries:
+            self.entries[key]["count"] = self.category_counts[category]
+        else:
+            entry = {"type": "category", "label": category, "count": self.category_counts[category]}
+            self._put(key, entry, set(tokenize(category)))
+
+    def put_item(self, item):
+        item_id = item["Item ID"]
+        self.remove_item(item_id)
+        name = item.get("Name") if isinstance(item.get("Name"), str) else ""
+        tokens = set(tokenize(name))
+        tokens.add(str(item_id))
+        entry = {
+            "type": "item",
+            "item_id": item_id,
+            "label": name or str(item_id),
+            "thumbnail_url": image_url(item.get("main_photo_url"), "list"),
+        }
+        self._put(("item", item_id), entry, tokens)
+        self.item_categories[item_id] = item.get("Category")
+        self._count_category(item.get("Category"), 1)
+
+    def remove_item(self, item_id):
+        if item_id in self.item_categories:
+            self._count_category(self.item_categories.pop(item_id), -1)
+        self._drop(("item", item_id))
+
+
+def _rank(entry):
+    # Categorias primeiro, depois produtos, em ordem alfabética
+    return (0 if entry["type"] == "category" else 1, entry["label"].lower())
+
+
+class SuggestIndex:
+    """
+    Índice em memória para o autocompletar da busca do catálogo.
+
+    Guarda uma árvore de prefixos com os termos do nome de cada produto, o
+    Item ID e as categorias, de modo que cada tecla digitada é respondida sem
+    consultar o MongoDB nem o Oracle. O índice é carregado em segundo plano. As
+    escritas administrativas deste worker atualizam só os itens alterados; os demais
+    workers percebem a mudança pela versão do catálogo, verificada em segundo plano,
+    e reconstroem o índice.
+    """
+
+    def __init__(self, poll_interval=None):
+        if poll_interval is None:
+            poll_interval = float(os.getenv("SUGGEST_INDEX_POLL_INTERVAL", DEFAULT_POLL_INTERVAL))
+        self.poll_interval = poll_interval
+        self._snapshot = None
+        self._version = None
+        self._built_at = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def rebuild(self, if_missing=False):
+        """Reconstrói o índice inteiro a partir da coleção items."""
+        with self._build_lock:
+            if if_missing and self._snapshot is not None:
+                return len(self._snapshot.entries)
+            # Lida antes da varredura: uma alteração durante a leitura gera nova reconstrução
+            version, _ = catalog_version.current()
+            snapshot = _Snapshot()
+            for item in get_items_collection().find({"Item ID": {"$exists": True}}, SUGGEST_PROJECTION):
+                snapshot.put_item(item)
+            with self._lock:
+                self._snapshot = snapshot
+                self._version = version
+                self._built_at = time.time()
+            return len(snapshot.entries)
+
+    def _run(self):
+        try:
+            self.rebuild(if_missing=True)
+        except Exception as e:
+            print(f"Erro ao carregar o índice de sugestões: {e}")
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                version, _ = catalog_version.current()
+                if version != self._version:
+                    self.rebuild()
+            except Exception as e:
+                print(f"Erro ao atualizar o índice de sugestões: {e}")
+
+    def _ensure_worker(self):
+        # A thread é iniciada sob demanda e recriada após um fork (workers do gunicorn)
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="suggest-index", daemon=True)
+            self._thread.start()
+
+    def start(self):
+        """Inicia (ou reinicia, após um fork) a thread que carrega e atualiza o índice."""
+        self._ensure_worker()
+
+    def update_items(self, item_ids=None):
+        """Aplica ao índice as alterações dos itens informados (None agenda uma reconstrução)."""
+        if self._snapshot is None:
+            return
+        if item_ids is None:
+            self._version = None
+            return
+        item_ids = [item_id for item_id in dict.fromkeys(item_ids) if item_id is not None]
+        if not item_ids:
+            return
+        items = {item["Item ID"]: item for item in get_items_collection().find({"Item ID": {"$in": item_ids}}, SUGGEST_PROJECTION)}
+        with self._lock:
+            for item_id in item_ids:
+                if item_id in items:
+                    self._snapshot.put_item(items[item_id])
+                else:
+                    self._snapshot.remove_item(item_id)
+            # catalog_version.bump (registrado antes) já gravou a versão desta escrita. Se ela é a
+            # seguinte à do índice, o índice está em dia; um salto maior inclui escritas de outros
+            # workers, que só a reconstrução feita pela thread aplica.
+            version, _ = catalog_version.current()
+            if self._version is not None and version == self._version + 1:
+                self._version = version
+
+    def suggest(self, query, limit=DEFAULT_SUGGESTIONS):
+        """
+        Retorna até 'limit' sugestões cujos termos começam com os termos da consulta
+        (nenhuma enquanto o índice ainda está sendo carregado em segundo plano).
+        """
+        self._ensure_worker()
+        tokens = tokenize(query)
+        if not tokens or self._snapshot is None:
+            return []
+        limit = max(1, min(limit, MAX_SUGGESTIONS))
+
+        with self._lock:
+            snapshot = self._snapshot
+            nodes = [snapshot.trie.find(token) for token in dict.fromkeys(tokens)]
+            if any(node is None for node in nodes):
+                return []
+            if len(nodes) == 1:
+                node = nodes[0]
+                if node.top is None:
+                    node.top = sorted(node.keys, key=lambda key: _rank(snapshot.entries[key]))[:MAX_SUGGESTIONS]
+                keys = node.top[:limit]
+            else:
+                nodes.sort(key=lambda node: len(node.keys))
+                candidates = set(nodes[0].keys).intersection(*(node.keys for node in nodes[1:]))
+                keys = sorted(candidates, key=lambda key: _rank(snapshot.entries[key]))[:limit]
+            if len(tokens) == 1 and tokens[0].isdigit():
+                # O produto com o Item ID digitado vem sempre em primeiro
+                exact = ("item", int(tokens[0]))
+                if exact in snapshot.entries:
+                    keys = [exact] + [key for key in keys if key != exact][:limit - 1]
+            return [dict(snapshot.entries[key]) for key in keys]
+
+    def matching_item_ids(self, query):
+        """
+        Item IDs, em ordem crescente, dos produtos cujos termos (nome e Item ID) começam com
+        todos os termos da consulta. Usado pela busca do catálogo quando o índice de texto não
+        encontra nada; se o índice ainda não foi carregado em segundo plano, carrega-o agora.
+        """
+        self._ensure_worker()
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        if self._snapshot is None:
+            self.rebuild(if_missing=True)
+
+        with self._lock:
+            nodes = [self._snapshot.trie.find(token) for token in dict.fromkeys(tokens)]
+            if any(node is None for node in nodes):
+                return []
+            nodes.sort(key=lambda node: len(node.keys))
+            keys = set(nodes[0].keys).intersection(*(node.keys for node in nodes[1:]))
+        return sorted(key[1] for key in keys if key[0] == "item")
+
+    def status(self):
+        snapshot = self._snapshot
+        return {
+            "loaded": snapshot is not None,
+            "entries": len(snapshot.entries) if snapshot else 0,
+            "built_at": self._built_at,
+            "catalog_version": self._version,
+        }
+
+
+# Instância global para ser usada nas rotas
+suggest_index = SuggestIndex()
+on_catalog_change(suggest_index.update_items)
@@ -4,9 +4,12 @@
 let currentTab = 'items';
 let currentView = 'grid'; // 'grid' ou 'table'
 let items = [];
+let photosByItem = {}; // fotos dos produtos da página atual, carregadas em um único pedido
 let cart = [];
 let orders = [];
 let cargo = [];
+let ordersCursor = null; // next_cursor da listagem de pedidos (null = não há mais páginas)
+let cargoCursor = null;
 let currentUser = null;
 let authToken = localStorage.getItem('vasap_auth_token');
 
@@ -30,6 +33,7 @@ document.addEventListener('DOMContentLoaded', function() {
     if (document.getElementById('items-grid-container')) { // <-- CORREÇÃO APLICADA AQUI
         console.log("Executando inicialização da Loja...");
         loadCategories();
+        setupSearchSuggestions();
         loadItems(); // Agora esta função será chamada corretamente
         loadCart();
         loadOrders();
@@ -228,6 +232,7 @@ function loadItems(page = 1) {
             items = data.items || [];
             totalPages = data.pagination ? data.pagination.total_pages : 1;
             displayItems();
+            loadPagePhotos(items);
             if (data.pagination) updatePagination(data.pagination);
         })
         .catch(error => {
@@ -266,29 +271,46 @@ function loadCartTotals() {
     .catch(error => console.error('Erro ao carregar totais do carrinho:', error));
 }
 
-function loadOrders() {
+// A listagem vem paginada por cursor; 'append' acrescenta a próxima página à lista atual
+function loadOrders(append = false) {
     if (!authToken) return;
-    fetch("/api/pedidos/", {
+    const url = append && ordersCursor ? `/api/pedidos/?cursor=${encodeURIComponent(ordersCursor)}` : "/api/pedidos/";
+    fetch(url, {
         headers: { "Authorization": `Bearer ${authToken}` }
     })
     .then(response => response.json())
     .then(data => {
-        orders = data;
+        orders = append ? orders.concat(data.orders) : data.orders;
+        ordersCursor = data.next_cursor;
         displayOrders();
     })
     .catch(error => console.error('Erro ao carregar pedidos:', error));
 }
 
-function loadCargo() {
-    fetch('/api/cargo/')
+function loadCargo(append = false) {
+    if (!authToken) return;
+    const url = append && cargoCursor ? `/api/cargo/?cursor=${encodeURIComponent(cargoCursor)}` : '/api/cargo/';
+    fetch(url, {
+        headers: { "Authorization": `Bearer ${authToken}` }
+    })
         .then(response => response.json())
         .then(data => {
-            cargo = data;
+            cargo = append ? cargo.concat(data.orders) : data.orders;
+            cargoCursor = data.next_cursor;
             displayCargo();
         })
         .catch(error => console.error('Erro ao carregar cargo:', error));
 }
 
+function loadMoreButton(onclick) {
+    return `
+        <div class="text-center mb-3">
+            <button class="btn btn-outline-secondary btn-sm" onclick="${onclick}">
+                <i class="fas fa-chevron-down"></i> Carregar mais
+            </button>
+        </div>`;
+}
+
 function loadCategories() {
     fetch('/api/items/categories')
         .then(response => response.json())
@@ -459,7 +481,7 @@ function displayItemsAsGrid() {
     }
     
     container.innerHTML = items.map(item => {
-        const imageUrl = item.main_photo_url || 'no-image.png';
+        const imageUrl = item.thumbnail_url || item.main_photo_url || 'no-image.png';
 
         // --- INÍCIO DA LÓGICA ADICIONADA ---
         // Define o passo do incremento. Se Group Pile for 0 ou inválido, o passo é 1.
@@ -609,7 +631,7 @@ function displayItemsAsTable() {
     }
 
     tableBody.innerHTML = items.map(item => {
-        const imageUrl = item.main_photo_url || 'no-image.png';
+        const imageUrl = item.thumbnail_url || item.main_photo_url || 'no-image.png';
         
         // --- INÍCIO DA LÓGICA ADICIONADA ---
         const groupPile = item['Group Pile'] > 0 ? item['Group Pile'] : 1;
@@ -772,7 +794,7 @@ function displayOrders() {
                 </button>
             </div>
         </div>
-    `}).join('');
+    `}).join('') + (ordersCursor ? loadMoreButton('loadOrders(true)') : '');
 }
 
 function formalizeOrder(orderId) {
@@ -863,7 +885,7 @@ function displayCargo() {
                 </div>
             </div>
         </div>
-    `).join('');
+    `).join('') + (cargoCursor ? loadMoreButton('loadCargo(true)') : '');
 }
 
 function openCargoOptimizerForOrder(orderNumber) {
@@ -911,6 +933,45 @@ function applyFilters() {
     loadItems(1); // Volta para a primeira página
 }
 
+// Autocompletar da busca: consulta o índice em memória do servidor a cada tecla
+let suggestTimer = null;
+let suggestController = null;
+
+function setupSearchSuggestions() {
+    const input = document.getElementById('search-input');
+    const datalist = document.getElementById('search-suggestions');
+    if (!input || !datalist) return;
+
+    input.addEventListener('input', () => {
+        clearTimeout(suggestTimer);
+        const query = input.value.trim();
+        if (query.length < 2) {
+            datalist.innerHTML = '';
+            return;
+        }
+        suggestTimer = setTimeout(() => {
+            if (suggestController) suggestController.abort();
+            suggestController = new AbortController();
+            fetch(`/api/items/suggest?q=${encodeURIComponent(query)}`, { signal: suggestController.signal })
+                .then(response => response.json())
+                .then(data => {
+                    datalist.innerHTML = '';
+                    data.suggestions.forEach(suggestion => {
+                        const option = document.createElement('option');
+                        option.value = suggestion.label;
+                        option.label = suggestion.type === 'category'
+                            ? `Categoria (${suggestion.count})`
+                            : `Código ${suggestion.item_id}`;
+                        datalist.appendChild(option);
+                    });
+                })
+                .catch(error => {
+                    if (error.name !== 'AbortError') console.error('Erro ao buscar sugestões:', error);
+                });
+        }, 80);
+    });
+}
+
 function clearFilters() {
     currentFilters = {};
     const form = document.querySelector('.filter-card');
@@ -1135,13 +1196,22 @@ function deletePhoto(photoId) {
 
 
 function showOrderDetails(orderId) {
-    // Encontra o pedido na lista já carregada
-    const order = orders.find(o => o._id === orderId);
-    if (!order || !order.items) {
-        showAlert('Detalhes do pedido não encontrados ou pedido antigo sem itens salvos.', 'warning');
-        return;
-    }
+    // A listagem só traz o resumo; os itens vêm da rota de detalhe do pedido
+    fetch(`/api/pedidos/${orderId}`, {
+        headers: { "Authorization": `Bearer ${authToken}` }
+    })
+    .then(response => response.ok ? response.json() : null)
+    .then(order => {
+        if (!order || !order.items) {
+            showAlert('Detalhes do pedido não encontrados ou pedido antigo sem itens salvos.', 'warning');
+            return;
+        }
+        renderOrderDetails(order);
+    })
+    .catch(() => showAlert('Erro ao carregar os detalhes do pedido.', 'danger'));
+}
 
+function renderOrderDetails(order) {
     const modalTitle = document.getElementById('orderDetailsModalTitle');
     const modalBody = document.getElementById('orderDetailsModalBody');
 
@@ -1240,9 +1310,28 @@ function addGridItemToCart(itemId) {
     quantityInput.value = '';
 }
 
+// Busca as fotos de todos os produtos da página em uma única requisição (em vez de uma por galeria aberta)
+function loadPagePhotos(pageItems) {
+    photosByItem = {};
+    const itemIds = pageItems.filter(item => item.photo_count !== 0).map(item => item['Item ID']);
+    if (itemIds.length === 0) return;
+    fetch(`/api/items/photos/batch?ids=${itemIds.join(',')}`)
+        .then(response => response.ok ? response.json() : {})
+        .then(photos => {
+            // Ignora a resposta se o usuário já mudou de página
+            if (items === pageItems) photosByItem = photos;
+        })
+        .catch(error => console.error('Erro ao carregar fotos da página:', error));
+}
+
+function fetchItemPhotos(itemId) {
+    if (photosByItem[itemId]) return Promise.resolve(photosByItem[itemId]);
+    // Galeria aberta antes do carregamento em lote (ou produto fora da página atual)
+    return fetch(`/api/items/${itemId}/photos`).then(response => response.json());
+}
+
 function showImageGallery(itemId) {
-    fetch(`/api/items/${itemId}/photos`)
-        .then(response => response.json())
+    fetchItemPhotos(itemId)
         .then(photos => {
             if (!photos || photos.length === 0) {
                 showAlert('Nenhuma foto adicional encontrada para este produto.', 'info');
@@ -1268,7 +1357,7 @@ function showImageGallery(itemId) {
                 // Adiciona a imagem ao slide
                 innerContainer.innerHTML += `
                     <div class="carousel-item ${isActive}">
-                        <img src="${photo['Photo URL']}" class="d-block w-100" alt="${photo.Description || 'Foto do produto'}">
+                        <img src="${photo.detail_url || photo['Photo URL']}" class="d-block w-100" alt="${photo.Description || 'Foto do produto'}">
                         ${photo.Description ? `<div class="carousel-caption d-none d-md-block"><p>${photo.Description}</p></div>` : ''}
                     </div>
                 `;